@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -22,6 +23,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricasMiddleware",  # /metrics: latência e consultas por view
+    "core.middleware.PerfilSQLMiddleware",  # orçamento de SQL + Server-Timing
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,6 +82,46 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10"))
 REQUEST_RETRIES = int(os.getenv("REQUEST_RETRIES", "2"))
 
+# Tamanho dos lotes de gravação do sync_all (bulk_create)
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", "1000"))
+
+# Cache (contadores/listas do dashboard). CACHE_BACKEND=locmem (padrão,
+# por processo) ou file (compartilhado entre processos, em CACHE_DIR).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR") or os.path.join(tempfile.gettempdir(), "usercompare_cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "usercompare",
+        }
+    }
+
+# Dashboard: linhas por página (paginação por id) e validade das entradas
+# em cache (as chaves já mudam a cada sync; o TTL só limpa as antigas)
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", "100"))
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "3600"))  # segundos
+
+# Sincronização de usuários: linhas por página da tabela de checagem
+CHECKS_PAGE_SIZE = int(os.getenv("CHECKS_PAGE_SIZE", "50"))
+
+# Perfil de SQL por requisição (core.middleware.PerfilSQLMiddleware)
+SQL_ORCAMENTO_PADRAO = int(os.getenv("SQL_ORCAMENTO_PADRAO", "50"))  # consultas, se a view não declarar
+SQL_LENTO_MS = float(os.getenv("SQL_LENTO_MS", "200"))
+SQL_ORCAMENTO_ESTRITO = os.getenv("SQL_ORCAMENTO_ESTRITO", "0") == "1"  # estourar vira exceção
+
+# /metrics: se definido, exige "Authorization: Bearer <token>";
+# sem token, só responde para a própria máquina (127.0.0.1 / ::1) e sem
+# cabeçalho de proxy. Com proxy reverso local na frente do waitress, defina
+# o token: para o Django toda requisição vem de 127.0.0.1
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login/"
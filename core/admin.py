@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser,
-    SyncRun, SyncDetail
+    SyncRun, SyncDetail, ReconciliationResult, SyncJob
 )
 
 admin.site.register(BitrixUser)
@@ -10,5 +10,7 @@ admin.site.register(GesttaUser)
 admin.site.register(DominioAccount)
 admin.site.register(CcontrolWebUser)
 admin.site.register(VisaoLogicaUser)
+admin.site.register(ReconciliationResult)
 admin.site.register(SyncRun)
 admin.site.register(SyncDetail)
+admin.site.register(SyncJob)
@@ -0,0 +1,83 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from core.services.metricas import LATENCIA_VIEW, QUERIES_VIEW, REQUISICOES
+from core.services.perfil_sql import OrcamentoSQLExcedido, PerfilSQL
+
+
+logger = logging.getLogger("core.sql")
+
+
+class MetricasMiddleware:
+    """
+    Mede latência, consultas SQL e status de cada requisição, rotulando
+    pelo nome da rota (ex.: core:dashboard). Exposto em /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consultas = [0]
+
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            response = self.get_response(request)
+        duracao = time.perf_counter() - inicio
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "sem_rota"
+        LATENCIA_VIEW.observar(duracao, view)
+        QUERIES_VIEW.observar(consultas[0], view)
+        REQUISICOES.inc(view, str(response.status_code))
+        return response
+
+
+class PerfilSQLMiddleware:
+    """
+    Perfil de SQL por requisição: nº de consultas, tempo no banco e as
+    consultas mais lentas. Devolve tudo no header Server-Timing e loga
+    (logger "core.sql") quando a view passa do orçamento declarado com
+    @orcamento_sql (ou do SQL_ORCAMENTO_PADRAO) ou quando alguma consulta
+    passa de SQL_LENTO_MS. Com SQL_ORCAMENTO_ESTRITO=True, estourar o
+    orçamento vira exceção (para os testes falharem).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        perfil = PerfilSQL()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(perfil):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+        db_ms = perfil.tempo * 1000
+
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{perfil.consultas} consultas", '
+            f"app;dur={max(0.0, total_ms - db_ms):.1f}"
+        )
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else request.path
+        orcamento = getattr(match.func, "orcamento_sql", None) if match else None
+        if orcamento is None:
+            orcamento = settings.SQL_ORCAMENTO_PADRAO
+
+        if perfil.consultas > orcamento:
+            msg = f"{view}: {perfil.consultas} consultas (orçamento {orcamento})\n{perfil.resumo()}"
+            if settings.SQL_ORCAMENTO_ESTRITO:
+                raise OrcamentoSQLExcedido(msg)
+            logger.warning(msg)
+        elif perfil.mais_lentas and perfil.mais_lentas[0][0] > settings.SQL_LENTO_MS:
+            logger.warning(f"{view}: consulta lenta\n{perfil.resumo()}")
+
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_remove_pontocontact_core_pontoc_nome_689dfd_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ponto_ok', models.BooleanField(default=False)),
+                ('ponto_motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('gestta_ok', models.BooleanField(default=False)),
+                ('gestta_motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('dominio_ok', models.BooleanField(default=False)),
+                ('dominio_motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('web_ok', models.BooleanField(default=False)),
+                ('web_motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('visao_ok', models.BooleanField(default=False)),
+                ('visao_motivo', models.CharField(blank=True, default='', max_length=255)),
+                ('bitrix_user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reconciliacao', to='core.bitrixuser')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ponto_ok'], name='core_reconc_ponto_o_fa4fc2_idx'), models.Index(fields=['gestta_ok'], name='core_reconc_gestta__c5e41c_idx'), models.Index(fields=['dominio_ok'], name='core_reconc_dominio_3a529c_idx'), models.Index(fields=['web_ok'], name='core_reconc_web_ok_23772a_idx'), models.Index(fields=['visao_ok'], name='core_reconc_visao_o_7a18d3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_reconciliationresult'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncdetail',
+            name='fonte',
+            field=models.CharField(choices=[('BITRIX', 'BITRIX'), ('Ponto', 'Ponto'), ('GESTTA', 'GESTTA'), ('DOMINIO', 'DOMINIO'), ('CCONTROLWEB', 'CCONTROLWEB'), ('VISAOLOGICA', 'VISAOLOGICA'), ('RECONCILIACAO', 'RECONCILIACAO')], max_length=20),
+        ),
+    ]
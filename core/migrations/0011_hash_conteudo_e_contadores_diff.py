@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_alter_syncdetail_fonte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bitrixuser',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='ccontrolwebuser',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='gesttauser',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='pontocontact',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='atualizados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='inalterados',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='inseridos',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='removidos',
+            field=models.IntegerField(default=0),
+        ),
+    ]
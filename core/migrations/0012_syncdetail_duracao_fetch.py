@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hash_conteudo_e_contadores_diff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncdetail',
+            name='duracao_fetch',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_syncdetail_duracao_fetch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tipo', models.CharField(choices=[('sync_all', 'Atualizar banco (todas as fontes)'), ('sync_bases', 'Atualizar bases Ponto/Bitrix (CPF)'), ('run_sync', 'Enviar CPFs ao Bitrix')], max_length=20)),
+                ('status', models.CharField(choices=[('pendente', 'pendente'), ('executando', 'executando'), ('sucesso', 'sucesso'), ('erro', 'erro')], default='pendente', max_length=20)),
+                ('solicitado_por', models.CharField(blank=True, default='', max_length=150)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('resultado', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='core_syncjo_status_ada280_idx')],
+            },
+        ),
+    ]
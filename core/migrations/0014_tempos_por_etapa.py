@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_syncjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncdetail',
+            name='bytes_baixados',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='duracao_decode',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='duracao_escrita',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='duracao_total',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncdetail',
+            name='duracao_transform',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='duracao_total',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='tipo',
+            field=models.CharField(choices=[('sync_all', 'sync_all'), ('sync_bases', 'sync_bases'), ('run_sync', 'run_sync')], db_index=True, default='sync_all', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='syncdetail',
+            name='fonte',
+            field=models.CharField(choices=[('BITRIX', 'BITRIX'), ('Ponto', 'Ponto'), ('GESTTA', 'GESTTA'), ('DOMINIO', 'DOMINIO'), ('CCONTROLWEB', 'CCONTROLWEB'), ('VISAOLOGICA', 'VISAOLOGICA'), ('RECONCILIACAO', 'RECONCILIACAO'), ('MYSQL_PONTO', 'MYSQL_PONTO'), ('MYSQL_BITRIX', 'MYSQL_BITRIX'), ('MATCH_CPF', 'MATCH_CPF'), ('ENVIO_CPF', 'ENVIO_CPF')], max_length=20),
+        ),
+    ]
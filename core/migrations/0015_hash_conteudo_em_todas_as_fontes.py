@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_tempos_por_etapa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dominioaccount',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='visaologicauser',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='bitrixuser',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='pontocontact',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
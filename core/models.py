@@ -23,6 +23,7 @@ class BitrixUser(TimeStampedModel):
     departamento_principal = models.CharField(max_length=255, null=True, blank=True)
     email = models.CharField(max_length=255, null=True, blank=True)
     fonte_raw = models.JSONField(default=dict, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     class Meta:
         indexes = [
@@ -41,6 +42,7 @@ class PontoContact(TimeStampedModel):
     nome_completo = models.CharField(max_length=255)
     status_ponto = models.CharField(max_length=255)
     fonte_raw = models.JSONField(default=dict, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     def __str__(self):
         return f"{self.nome_completo} <{self.status_ponto}>"
@@ -49,6 +51,7 @@ class GesttaUser(TimeStampedModel):
     name = models.CharField(max_length=255)
     email = models.CharField(max_length=255, unique=True)
     fonte_raw = models.JSONField(default=dict, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     def __str__(self):
         return f"{self.name} <{self.email}>"
@@ -58,6 +61,7 @@ class DominioAccount(TimeStampedModel):
     id_externo = models.IntegerField(unique=True, null=False, blank=False)
     nome = models.CharField(max_length=255)
     fonte_raw = models.JSONField(null=True, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     def __str__(self):
         return f"{self.id_externo} - {self.nome}"
@@ -67,6 +71,7 @@ class CcontrolWebUser(TimeStampedModel):
     nome_completo = models.CharField(max_length=255)
     email = models.CharField(max_length=255, unique=True)
     fonte_raw = models.JSONField(default=dict, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     def __str__(self):
         return f"{self.nome_completo} <{self.email}>"
@@ -76,11 +81,56 @@ class VisaoLogicaUser(TimeStampedModel):
     nome_funcionario = models.CharField(max_length=255)
     dep_funcionario = models.CharField(max_length=255)
     fonte_raw = models.JSONField(default=dict, blank=True)
+    hash_conteudo = models.CharField(max_length=40, blank=True, default="")
 
     def __str__(self):
         return f"{self.nome_funcionario}"
 
 
+# ======================================================
+# 🔹 RESULTADO MATERIALIZADO DA CONCILIAÇÃO
+# ======================================================
+class ReconciliationResult(TimeStampedModel):
+    """
+    Uma linha por BitrixUser com o status (ok/motivo) de cada fonte.
+    Reconstruída em lote ao final do sync_all; o dashboard só lê daqui.
+    """
+    bitrix_user = models.OneToOneField(
+        BitrixUser, related_name="reconciliacao", on_delete=models.CASCADE
+    )
+    ponto_ok = models.BooleanField(default=False)
+    ponto_motivo = models.CharField(max_length=255, blank=True, default="")
+    gestta_ok = models.BooleanField(default=False)
+    gestta_motivo = models.CharField(max_length=255, blank=True, default="")
+    dominio_ok = models.BooleanField(default=False)
+    dominio_motivo = models.CharField(max_length=255, blank=True, default="")
+    web_ok = models.BooleanField(default=False)
+    web_motivo = models.CharField(max_length=255, blank=True, default="")
+    visao_ok = models.BooleanField(default=False)
+    visao_motivo = models.CharField(max_length=255, blank=True, default="")
+
+    FONTES = ("ponto", "gestta", "dominio", "web", "visao")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ponto_ok"]),
+            models.Index(fields=["gestta_ok"]),
+            models.Index(fields=["dominio_ok"]),
+            models.Index(fields=["web_ok"]),
+            models.Index(fields=["visao_ok"]),
+        ]
+
+    def como_dict(self):
+        """Mesmo formato devolvido pela validação: {fonte: (ok, motivo)}."""
+        return {
+            f: (getattr(self, f"{f}_ok"), getattr(self, f"{f}_motivo"))
+            for f in self.FONTES
+        }
+
+    def __str__(self):
+        return f"Conciliação {self.bitrix_user_id}"
+
+
 # ======================================================
 # 🔹 MODELOS DE SINCRONIZAÇÃO (LOG DE EXECUÇÃO)
 # ======================================================
@@ -90,8 +140,16 @@ class SyncRun(TimeStampedModel):
         ("success", "success"),
         ("error", "error"),
     )
+    # sync_all = atualização das fontes do dashboard; os demais vêm de sincronizacao_user
+    TIPO_CHOICES = (
+        ("sync_all", "sync_all"),
+        ("sync_bases", "sync_bases"),
+        ("run_sync", "run_sync"),
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default="sync_all", db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
     mensagem = models.TextField(blank=True, default="")
+    duracao_total = models.FloatField(null=True, blank=True)  # segundos
 
     def __str__(self):
         return f"Execução {self.id} - {self.status} ({self.created_at:%d/%m/%Y %H:%M})"
@@ -101,6 +159,16 @@ class SyncDetail(TimeStampedModel):
     """
     Registra o resultado da sincronização por fonte
     (ex: BITRIX, Ponto, GESTTA, DOMINIO, CCONTROLWEB)
+    e da etapa de conciliação (RECONCILIACAO: lidos = usuários,
+    gravados = recalculados, ignorados = sem alteração).
+
+    As etapas do sincronizacao_user também ficam aqui: MYSQL_PONTO e
+    MYSQL_BITRIX (carga do cache), MATCH_CPF (geração dos checks) e
+    ENVIO_CPF (webhook: lidos = enviados, gravados = aceitos pelo Bitrix,
+    ignorados = já aceitos antes, não reenviados).
+
+    Tempos em segundos: fetch (rede/consulta), decode (JSON), transform
+    (montar as instâncias), escrita (banco ou webhook) e total da fonte.
     """
     FONTE_CHOICES = (
         ("BITRIX", "BITRIX"),
@@ -109,13 +177,84 @@ class SyncDetail(TimeStampedModel):
         ("DOMINIO", "DOMINIO"),
         ("CCONTROLWEB", "CCONTROLWEB"),
         ("VISAOLOGICA", "VISAOLOGICA"),
+        ("RECONCILIACAO", "RECONCILIACAO"),
+        ("MYSQL_PONTO", "MYSQL_PONTO"),
+        ("MYSQL_BITRIX", "MYSQL_BITRIX"),
+        ("MATCH_CPF", "MATCH_CPF"),
+        ("ENVIO_CPF", "ENVIO_CPF"),
     )
     run = models.ForeignKey(SyncRun, related_name="details", on_delete=models.CASCADE)
     fonte = models.CharField(max_length=20, choices=FONTE_CHOICES)
     lidos = models.IntegerField(default=0)
     gravados = models.IntegerField(default=0)
     ignorados = models.IntegerField(default=0)
+    # modo diff: quanto de escrita foi realmente feito / evitado
+    inseridos = models.IntegerField(default=0)
+    atualizados = models.IntegerField(default=0)
+    removidos = models.IntegerField(default=0)
+    inalterados = models.IntegerField(default=0)
+    duracao_fetch = models.FloatField(null=True, blank=True)  # segundos gastos no download
+    duracao_decode = models.FloatField(null=True, blank=True)
+    duracao_transform = models.FloatField(null=True, blank=True)
+    duracao_escrita = models.FloatField(null=True, blank=True)
+    duracao_total = models.FloatField(null=True, blank=True)
+    bytes_baixados = models.BigIntegerField(null=True, blank=True)
     mensagem_erro = models.TextField(blank=True, default="")
 
+    @property
+    def linhas_por_segundo(self):
+        if not self.duracao_total:
+            return None
+        return round(self.lidos / self.duracao_total, 1)
+
     def __str__(self):
         return f"{self.run_id} - {self.fonte}: {self.gravados}/{self.lidos}"
+
+
+# ======================================================
+# 🔹 FILA DE JOBS (EXECUÇÃO EM SEGUNDO PLANO)
+# ======================================================
+class SyncJob(TimeStampedModel):
+    """
+    Pedido de execução enfileirado pelas telas (sync_manual, sync_bases,
+    run_sync) e processado pelo worker (manage.py sync_worker).
+    Só um job fica 'executando' por vez; enquanto executa, updated_at é
+    o batimento renovado pelo worker (ver core.services.jobs).
+    """
+    TIPO_SYNC_ALL = "sync_all"
+    TIPO_SYNC_BASES = "sync_bases"
+    TIPO_RUN_SYNC = "run_sync"
+    TIPO_CHOICES = (
+        (TIPO_SYNC_ALL, "Atualizar banco (todas as fontes)"),
+        (TIPO_SYNC_BASES, "Atualizar bases Ponto/Bitrix (CPF)"),
+        (TIPO_RUN_SYNC, "Enviar CPFs ao Bitrix"),
+    )
+
+    STATUS_PENDENTE = "pendente"
+    STATUS_EXECUTANDO = "executando"
+    STATUS_SUCESSO = "sucesso"
+    STATUS_ERRO = "erro"
+    STATUS_CHOICES = (
+        (STATUS_PENDENTE, "pendente"),
+        (STATUS_EXECUTANDO, "executando"),
+        (STATUS_SUCESSO, "sucesso"),
+        (STATUS_ERRO, "erro"),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDENTE)
+    solicitado_por = models.CharField(max_length=150, blank=True, default="")
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+    mensagem = models.TextField(blank=True, default="")
+    resultado = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    @property
+    def ativo(self):
+        return self.status in (self.STATUS_PENDENTE, self.STATUS_EXECUTANDO)
+
+    def __str__(self):
+        return f"Job {self.id} - {self.tipo} ({self.status})"
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+def tamanho_lote_padrao():
+    return int(getattr(settings, "SYNC_CHUNK_SIZE", 1000))
+
+
+def em_lotes(iteravel, tamanho):
+    """Quebra qualquer iterável em listas de até `tamanho` itens."""
+    it = iter(iteravel)
+    while True:
+        lote = list(islice(it, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def batch_size_sqlite(model, objs, using="default"):
+    """
+    Maior batch_size que cabe no limite de variáveis por statement do banco
+    (no SQLite, max_query_params / nº de colunas do INSERT).
+    """
+    fields = model._meta.concrete_fields
+    return max(1, connections[using].ops.bulk_batch_size(fields, objs))
+
+
+def bulk_inserir(model, objs, chunk_size=None, rotulo=None):
+    """
+    Grava instâncias (ainda não salvas) com bulk_create, em lotes de
+    `chunk_size`, imprimindo o tempo de cada lote. Retorna o total gravado.
+    """
+    chunk_size = chunk_size or tamanho_lote_padrao()
+    rotulo = rotulo or model.__name__
+
+    total = 0
+    for n, lote in enumerate(em_lotes(objs, chunk_size), start=1):
+        inicio = time.perf_counter()
+        model.objects.bulk_create(lote, batch_size=batch_size_sqlite(model, lote))
+        total += len(lote)
+        print(f"   · {rotulo} lote {n}: {len(lote)} registros em {time.perf_counter() - inicio:.2f}s")
+    return total
+
+
+def _chaves_existentes(model, campo, chaves, tamanho=500):
+    """Quais das `chaves` já existem no banco (consulta fatiada por `tamanho`)."""
+    existentes = set()
+    chaves = list(chaves)
+    for i in range(0, len(chaves), tamanho):
+        fatia = chaves[i:i + tamanho]
+        existentes.update(
+            model.objects.filter(**{f"{campo}__in": fatia}).values_list(campo, flat=True)
+        )
+    return existentes
+
+
+def bulk_upsert(model, objs, unique_field, update_fields, chunk_size=None, rotulo=None):
+    """
+    Substitui laços de update_or_create: grava em lotes com
+    bulk_create(update_conflicts=True) usando `unique_field` como chave.
+
+    Campos auto_now (ex.: updated_at) entram no UPDATE automaticamente.
+    Chaves repetidas no mesmo lote ficam com a última ocorrência, como
+    aconteceria chamando update_or_create em sequência.
+
+    Retorna (criados, atualizados).
+    """
+    chunk_size = chunk_size or tamanho_lote_padrao()
+    rotulo = rotulo or model.__name__
+
+    field = model._meta.get_field(unique_field)
+    update_fields = list(update_fields) + [
+        f.name for f in model._meta.concrete_fields
+        if getattr(f, "auto_now", False) and f.name not in update_fields
+    ]
+
+    criados = atualizados = 0
+    for n, lote in enumerate(em_lotes(objs, chunk_size), start=1):
+        inicio = time.perf_counter()
+
+        por_chave = {}
+        for obj in lote:
+            chave = field.to_python(getattr(obj, field.attname))
+            setattr(obj, field.attname, chave)
+            if chave in por_chave:
+                atualizados += 1
+            por_chave[chave] = obj
+
+        existentes = _chaves_existentes(model, field.attname, por_chave.keys())
+        novos = len(por_chave) - len(existentes)
+
+        unicos = list(por_chave.values())
+        model.objects.bulk_create(
+            unicos,
+            batch_size=batch_size_sqlite(model, unicos),
+            update_conflicts=True,
+            unique_fields=[unique_field],
+            update_fields=update_fields,
+        )
+        criados += novos
+        atualizados += len(existentes)
+        print(
+            f"   · {rotulo} lote {n}: {novos} novos, {len(existentes)} atualizados "
+            f"em {time.perf_counter() - inicio:.2f}s"
+        )
+    return criados, atualizados
+
+
+def hash_registro(obj, campos):
+    """
+    Hash (sha1) dos campos normalizados + fonte_raw de uma instância.
+    Serve para saber, sem comparar campo a campo, se o registro mudou.
+    """
+    conteudo = {
+        "campos": {c: getattr(obj, c) for c in campos},
+        "fonte_raw": getattr(obj, "fonte_raw", None),
+    }
+    serializado = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(serializado.encode("utf-8")).hexdigest()
+
+
+def _remover(model, pks, tamanho=500):
+    pks = list(pks)
+    for i in range(0, len(pks), tamanho):
+        model.objects.filter(pk__in=pks[i:i + tamanho]).delete()
+    return len(pks)
+
+
+def sincronizar_diff(model, objs, campos, chave=None, chunk_size=None, rotulo=None):
+    """
+    Sincroniza a tabela com os registros recebidos gravando apenas a
+    diferença, comparando o hash de cada registro com o hash armazenado
+    (hash_conteudo).
+
+    - `objs`: qualquer iterável (lista ou stream); é processado em lotes.
+    - `campos`: campos normalizados que entram no hash (e são atualizados).
+    - `chave`: campo que identifica o registro na fonte (ex.: email). Sem
+      chave, o próprio hash é a identidade: registro alterado vira
+      remoção + inserção. Chave repetida no stream: fica a última
+      ocorrência (como no bulk_upsert e no modo flush), e as anteriores
+      contam em "duplicados".
+
+    Registros ausentes só são removidos no fim, depois de consumir tudo.
+    Retorna dict com inseridos, atualizados, removidos, inalterados e duplicados.
+    """
+    chunk_size = chunk_size or tamanho_lote_padrao()
+    rotulo = rotulo or model.__name__
+    update_fields = [c for c in campos if c != chave] + ["fonte_raw", "hash_conteudo", "updated_at"]
+
+    if chave is None:
+        # multiconjunto hash -> [pks] (nomes repetidos são legítimos em algumas fontes)
+        existentes = {}
+        for pk, h in model.objects.values_list("pk", "hash_conteudo"):
+            existentes.setdefault(h, []).append(pk)
+    else:
+        # chave -> (pk, hash); atualizado a cada lote gravado, então uma chave
+        # que reaparece num lote seguinte é comparada com o que acabou de ser gravado
+        existentes = {
+            k: (pk, h) for pk, k, h in model.objects.values_list("pk", chave, "hash_conteudo")
+        }
+        vistos = set()
+
+    inseridos = atualizados = inalterados = duplicados = 0
+
+    for lote in em_lotes(objs, chunk_size):
+        if chave is not None:
+            ultimos = {}
+            for obj in lote:
+                ultimos[getattr(obj, chave)] = obj
+            duplicados += len(lote) - len(ultimos)
+            lote = list(ultimos.values())
+
+        novos, alterados = [], []
+        agora = timezone.now()
+
+        for obj in lote:
+            obj.hash_conteudo = hash_registro(obj, campos)
+
+            if chave is None:
+                pks = existentes.get(obj.hash_conteudo)
+                if pks:
+                    pks.pop()
+                    inalterados += 1
+                else:
+                    novos.append(obj)
+                continue
+
+            k = getattr(obj, chave)
+            # já gravada por um lote anterior: conta como duplicado, mas prevalece
+            repetida = k in vistos
+            duplicados += repetida
+            vistos.add(k)
+            atual = existentes.get(k)
+            if atual is None:
+                novos.append(obj)
+            elif atual[1] == obj.hash_conteudo:
+                inalterados += not repetida
+            else:
+                obj.pk = atual[0]
+                if obj.pk is None:
+                    # banco que não devolve o pk no bulk_create
+                    obj.pk = model.objects.values_list("pk", flat=True).get(**{chave: k})
+                obj.updated_at = agora
+                alterados.append(obj)
+                atualizados += not repetida
+
+        inseridos += bulk_inserir(model, novos, chunk_size=chunk_size, rotulo=f"{rotulo} (novos)")
+        if alterados:
+            model.objects.bulk_update(alterados, update_fields, batch_size=batch_size_sqlite(model, alterados))
+        if chave is not None:
+            for obj in novos + alterados:
+                existentes[getattr(obj, chave)] = (obj.pk, obj.hash_conteudo)
+
+    if chave is None:
+        sobrando = [pk for pks in existentes.values() for pk in pks]
+    else:
+        sobrando = [pk for k, (pk, _) in existentes.items() if k not in vistos]
+    removidos = _remover(model, sobrando)
+
+    return {
+        "inseridos": inseridos,
+        "atualizados": atualizados,
+        "removidos": removidos,
+        "inalterados": inalterados,
+        "duplicados": duplicados,
+    }
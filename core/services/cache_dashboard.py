@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from core.models import BitrixUser, SyncRun
+from core.services.reconciliacao import FONTES
+
+
+# Agregados do dashboard que só mudam quando um sync_all grava dados.
+# A chave leva o id do último sync_all encerrado: o sync seguinte muda a
+# chave e as entradas antigas simplesmente expiram (DASHBOARD_CACHE_TTL).
+#
+# "Encerrado" inclui status error: uma fonte que falha não impede a
+# gravação (e a reconciliação) das demais, então os números mudam mesmo
+# assim. Execuções em andamento não contam; o cache vira no fim delas.
+
+
+def versao_dados():
+    """Id do último SyncRun sync_all encerrado (0 se nunca houve)."""
+    pk = (
+        SyncRun.objects.filter(tipo="sync_all")
+        .exclude(status="running")
+        .order_by("-id")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    return pk or 0
+
+
+def em_cache(nome, calcular, versao, *partes, cachear_se=None):
+    """
+    Valor de `calcular()` guardado em cache sob (nome, versão, partes).
+    `cachear_se(valor)` falso devolve o valor sem gravá-lo no cache.
+    """
+    sufixo = hashlib.sha1(json.dumps(partes, sort_keys=True).encode()).hexdigest()[:16] if partes else ""
+    chave = f"dashboard:{nome}:v{versao}:{sufixo}"
+    valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        if cachear_se is None or cachear_se(valor):
+            cache.set(chave, valor, settings.DASHBOARD_CACHE_TTL)
+    return valor
+
+
+def contadores_divergencia(versao):
+    """
+    {fonte: nº de usuários ativos divergentes} (cache por sync).
+    Ativo ainda sem ReconciliationResult não entra na contagem; nesse caso
+    o valor parcial não vai para o cache (valeria até o próximo sync).
+    """
+    cont = em_cache("cont_div", lambda: BitrixUser.objects.filter(status="Ativo").aggregate(
+        sem_resultado=Count("pk", filter=Q(reconciliacao__isnull=True)),
+        **{k: Count("pk", filter=Q(**{f"reconciliacao__{k}_ok": False})) for k in FONTES}
+    ), versao, cachear_se=lambda c: c["sem_resultado"] == 0)
+    return {k: cont[k] for k in FONTES}
+
+
+def lista_departamentos(versao):
+    """Departamentos distintos do Bitrix, em ordem (cache por sync)."""
+    return em_cache("departamentos", lambda: list(
+        BitrixUser.objects.exclude(departamento_principal__isnull=True)
+        .exclude(departamento_principal__exact="")
+        .values_list("departamento_principal", flat=True)
+        .distinct()
+        .order_by("departamento_principal")
+    ), versao)
+
+
+def total_filtrado(users, filtros, versao):
+    """COUNT do filtro atual (cache por sync e por combinação de filtros)."""
+    return em_cache("total", users.count, versao, filtros)
@@ -0,0 +1,79 @@
+from django.db.models import Q
+
+from core.models import BitrixUser
+from core.services.reconciliacao import FONTES, garantir_resultados
+
+
+# Filtros e serialização compartilhados pelo dashboard, pela API JSON e
+# pela exportação CSV/NDJSON (mesmos parâmetros GET nos três).
+
+CAMPOS_USUARIO = [
+    "id", "status", "nome_user", "nome_completo", "user_dominio", "user_local",
+    "departamento_principal", "email",
+]
+CAMPOS_EXPORTACAO = CAMPOS_USUARIO + [f"{f}_{c}" for f in FONTES for c in ("ok", "motivo")]
+
+SEM_RESULTADO = {f: (False, "sem verificação") for f in FONTES}
+
+
+def filtrar_usuarios(params):
+    """
+    Aplica status/departamento/q/div de `params` (request.GET) sobre
+    BitrixUser. Retorna (queryset, filtros normalizados).
+    """
+    status = params.get("status", "Ativo")  # padrão Ativo
+    dept = params.get("departamento") or ""
+    q = params.get("q") or ""
+    divergencias = (params.get("div") or "").lower()  # "ponto|gestta|dominio|web|visao" opcional
+
+    users = BitrixUser.objects.all()
+
+    if status in ("Ativo", "Inativo"):
+        users = users.filter(status=status)
+
+    if dept:
+        users = users.filter(departamento_principal=dept)
+
+    if q:
+        # busca "contém" mantendo sensibilidade — Django é case-sensitive em SQLite? Depende.
+        # Para MVP, usa icontains? NÃO. Precisamos sensível; então usamos contains puro.
+        users = users.filter(
+            Q(nome_user__contains=q) |
+            Q(nome_completo__contains=q) |
+            Q(user_dominio__contains=q) |
+            Q(user_local__contains=q) |
+            Q(email__contains=q)
+        )
+
+    if divergencias in FONTES:
+        # filtrar por divergência exige resultado materializado de todo o filtro
+        garantir_resultados(users)
+        # pediu ver só divergências dessa fonte => quem está ok fica de fora
+        users = users.filter(**{f"reconciliacao__{divergencias}_ok": False})
+    else:
+        divergencias = ""
+
+    return users, {"status": status, "departamento": dept, "q": q, "div": divergencias}
+
+
+def validacoes(u):
+    """{fonte: (ok, motivo)} do usuário (carregue com select_related("reconciliacao"))."""
+    if not hasattr(u, "reconciliacao"):
+        return SEM_RESULTADO
+    return u.reconciliacao.como_dict()
+
+
+def serializar_usuario(u):
+    """Dict para a API/NDJSON: campos do usuário + {fonte: {ok, motivo}}."""
+    dados = {c: getattr(u, c) for c in CAMPOS_USUARIO}
+    dados["validacao"] = {f: {"ok": ok, "motivo": motivo} for f, (ok, motivo) in validacoes(u).items()}
+    return dados
+
+
+def linha_exportacao(u):
+    """Dict plano (uma coluna por fonte/ok e fonte/motivo) para o CSV."""
+    dados = {c: getattr(u, c) for c in CAMPOS_USUARIO}
+    for f, (ok, motivo) in validacoes(u).items():
+        dados[f"{f}_ok"] = ok
+        dados[f"{f}_motivo"] = motivo
+    return dados
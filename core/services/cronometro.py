@@ -0,0 +1,50 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from core.models import SyncDetail
+
+
+class Cronometro:
+    """
+    Acumula tempo por etapa (fetch, decode, transform, escrita):
+
+        crono = Cronometro()
+        with crono.etapa("fetch"):
+            ...
+    """
+
+    def __init__(self):
+        self.tempos = defaultdict(float)
+        self._inicio = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[nome] += time.perf_counter() - inicio
+
+    @property
+    def total(self):
+        return time.perf_counter() - self._inicio
+
+
+def registrar_etapa(run, fonte, crono: Cronometro, **contadores):
+    """
+    Grava um SyncDetail com os tempos do cronômetro (se houver run).
+    `contadores`: lidos, gravados, inseridos, atualizados, mensagem_erro...
+    """
+    if run is None:
+        return None
+    return SyncDetail.objects.create(
+        run=run,
+        fonte=fonte,
+        duracao_fetch=crono.tempos.get("fetch"),
+        duracao_decode=crono.tempos.get("decode"),
+        duracao_transform=crono.tempos.get("transform"),
+        duracao_escrita=crono.tempos.get("escrita"),
+        duracao_total=crono.total,
+        **contadores,
+    )
@@ -1,67 +1,34 @@
 import os
 import requests
 from dotenv import load_dotenv
-from core.models import DominioAccount
+from core.services.http import baixar_json, iter_json_lista
 
 load_dotenv()
 
 
-def fetch_dominio():
+def fetch_dominio(stream=False, metricas=None):
     """
-    Faz a coleta e atualização dos dados da API do Domínio.
-    Usa o campo I_SECUSUARIOS como chave única (id_externo).
-    Garante que apenas registros válidos sejam salvos e
-    trata automaticamente erros e respostas vazias.
+    Faz a coleta dos dados da API do Domínio (sem gravar no banco).
+    A gravação (upsert por I_SECUSUARIOS -> id_externo) fica na etapa
+    sync_dominio do comando sync_all.
     """
     url = os.getenv("DOMINIO_URL")
 
+    if stream:
+        return iter_json_lista(url, "Domínio", metricas=metricas)
+
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        data = baixar_json(url, metricas=metricas)
+    except ValueError as e:
+        # vem antes: o JSONDecodeError do requests também é RequestException
+        raise Exception(f"Erro ao decodificar JSON: {e}")
     except requests.RequestException as e:
         raise Exception(f"Erro ao conectar à API do Domínio: {e}")
 
     try:
-        data = response.json()
         if not isinstance(data, list):
             raise ValueError("A resposta da API não é uma lista válida.")
     except Exception as e:
         raise Exception(f"Erro ao decodificar JSON: {e}")
 
-    lidos = 0
-    gravados = 0
-    ignorados = 0
-
-    for item in data:
-        # Ignora registros nulos, vazios ou inválidos
-        if not item or not isinstance(item, dict):
-            ignorados += 1
-            continue
-
-        codigo = item.get("I_SECUSUARIOS")
-        nome = item.get("NOME")
-
-        if codigo is None or not nome:
-            ignorados += 1
-            continue
-
-        try:
-            DominioAccount.objects.update_or_create(
-                id_externo=codigo,
-                defaults={
-                    "nome": nome.strip(),
-                    "fonte_raw": item,
-                },
-            )
-            gravados += 1
-        except Exception as e:
-            ignorados += 1
-            print(f"⚠️ Erro ao salvar registro {codigo} - {nome}: {e}")
-
-        lidos += 1
-
-    return {
-        "lidos": lidos,
-        "gravados": gravados,
-        "ignorados": ignorados,
-    }
+    return data
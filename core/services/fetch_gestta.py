@@ -1,21 +1,12 @@
 import os
-import requests
 from dotenv import load_dotenv
+from core.services.http import get_json_lista, iter_json_lista
 
 
 load_dotenv()
 
-def fetch_gestta():
+def fetch_gestta(stream=False, metricas=None):
     url = os.getenv("GESTTA_URL")
-    timeout = int(os.getenv("REQUEST_TIMEOUT", 10))
-    for attempt in range(int(os.getenv("REQUEST_RETRIES", 0)) + 1):
-        try:
-            r = requests.get(url, timeout=timeout)
-            r.raise_for_status()
-            data = r.json()
-            if not isinstance(data, list):
-                raise ValueError("Resposta GESTTA não é lista")
-            return data
-        except Exception as e:
-            last_err = e
-    raise last_err
+    if stream:
+        return iter_json_lista(url, "GESTTA", metricas=metricas)
+    return get_json_lista(url, "GESTTA", metricas=metricas)
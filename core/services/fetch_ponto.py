@@ -1,21 +1,12 @@
 import os
-import requests
 from dotenv import load_dotenv
+from core.services.http import get_json_lista, iter_json_lista
 
 
 load_dotenv()
 
-def fetch_ponto():
+def fetch_ponto(stream=False, metricas=None):
     url = os.getenv("PONTO_URL")
-    timeout = int(os.getenv("REQUEST_TIMEOUT", 10))
-    for attempt in range(int(os.getenv("REQUEST_RETRIES", 0)) + 1):
-        try:
-            r = requests.get(url, timeout=timeout)
-            r.raise_for_status()
-            data = r.json()
-            if not isinstance(data, list):
-                raise ValueError("Resposta Ponto não é lista")
-            return data
-        except Exception as e:
-            last_err = e
-    raise last_err
+    if stream:
+        return iter_json_lista(url, "Ponto", metricas=metricas)
+    return get_json_lista(url, "Ponto", metricas=metricas)
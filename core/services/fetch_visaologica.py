@@ -1,30 +1,17 @@
-import requests
 import os
 from dotenv import load_dotenv
+from core.services.http import get_json_lista, iter_json_lista
 
 
 load_dotenv()
 
 VISAOLOGICA_URL = os.getenv("VISAOLOGICA_URL")
-REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 10))
 
 
-def fetch_visaologica():
+def fetch_visaologica(stream=False, metricas=None):
     if not VISAOLOGICA_URL:
         raise ValueError("VISAOLOGICA_URL não carregada do .env")
 
-    for attempt in range(int(os.getenv("REQUEST_RETRIES", 0)) + 1):
-        try:
-            r = requests.get(VISAOLOGICA_URL, timeout=REQUEST_TIMEOUT)
-            r.raise_for_status()
-            data = r.json()
-
-            if not isinstance(data, list):
-                raise ValueError("Resposta Visão Lógica não é lista")
-
-            return data
-
-        except Exception as e:
-            last_err = e
-
-    raise last_err
+    if stream:
+        return iter_json_lista(VISAOLOGICA_URL, "Visão Lógica", metricas=metricas)
+    return get_json_lista(VISAOLOGICA_URL, "Visão Lógica", metricas=metricas)
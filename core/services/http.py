@@ -0,0 +1,199 @@
+import codecs
+import json
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+load_dotenv()
+
+REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 10))
+REQUEST_RETRIES = int(os.getenv("REQUEST_RETRIES", 2))
+REQUEST_BACKOFF = float(os.getenv("REQUEST_BACKOFF", 0.5))          # 0.5s, 1s, 2s, ...
+REQUEST_BACKOFF_JITTER = float(os.getenv("REQUEST_BACKOFF_JITTER", 0.3))
+REQUEST_BACKOFF_MAX = float(os.getenv("REQUEST_BACKOFF_MAX", 30))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", 64 * 1024))
+
+# Erros transitórios em que vale tentar de novo (429/503 respeitam Retry-After)
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+_session = None
+_lock = threading.Lock()
+
+
+def _nova_sessao():
+    retry = Retry(
+        total=REQUEST_RETRIES,
+        backoff_factor=REQUEST_BACKOFF,
+        backoff_jitter=REQUEST_BACKOFF_JITTER,
+        backoff_max=REQUEST_BACKOFF_MAX,
+        status_forcelist=STATUS_RETRY,
+        # só GET repete aqui: POST (webhooks do Bitrix) recua pelo token
+        # bucket do despacho, e uma escrita não é repetida às cegas
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        # esgotadas as tentativas, devolve a resposta (raise_for_status decide)
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def get_session():
+    """
+    Sessão HTTP única do processo: conexões keep-alive reaproveitadas
+    (pool por host) e retry com backoff exponencial + jitter (só GET).
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _nova_sessao()
+    return _session
+
+
+def baixar_json(url, timeout=None, metricas=None):
+    """
+    GET + decodificação JSON, separando os tempos: em `metricas` (dict)
+    grava "duracao" (rede), "decode" (JSON) e "bytes" (tamanho do corpo).
+    """
+    if metricas is None:
+        metricas = {}
+    inicio = time.perf_counter()
+    r = get_session().get(url, timeout=timeout or REQUEST_TIMEOUT)
+    r.raise_for_status()
+    corpo = r.content
+    metricas["duracao"] = time.perf_counter() - inicio
+    metricas["bytes"] = len(corpo)
+
+    inicio = time.perf_counter()
+    try:
+        return r.json()
+    finally:
+        metricas["decode"] = time.perf_counter() - inicio
+
+
+def get_json_lista(url, fonte, timeout=None, metricas=None):
+    """GET na URL da fonte e valida que a resposta é uma lista JSON."""
+    data = baixar_json(url, timeout=timeout, metricas=metricas)
+    if not isinstance(data, list):
+        raise ValueError(f"Resposta {fonte} não é lista")
+    return data
+
+
+_ESPACOS = " \t\r\n"
+# o que pode vir logo depois de um elemento do array
+_DELIMITADORES = _ESPACOS + ",]"
+
+
+def iter_json_array(blocos, fonte, encoding="utf-8"):
+    """
+    Parser incremental de um array JSON de topo: recebe blocos de bytes
+    (ex.: response.iter_content) e devolve cada elemento assim que ele
+    fica completo, sem manter o corpo inteiro em memória.
+    """
+    decoder = json.JSONDecoder()
+    texto = codecs.getincrementaldecoder(encoding)()
+    buf = ""
+    pos = 0
+    iniciado = False
+
+    for bloco in blocos:
+        buf += texto.decode(bloco)
+        while True:
+            while pos < len(buf) and buf[pos] in _ESPACOS:
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            if not iniciado:
+                if buf[pos] != "[":
+                    raise ValueError(f"Resposta {fonte} não é lista")
+                iniciado = True
+                pos += 1
+                continue
+
+            c = buf[pos]
+            if c == "]":
+                return
+            if c == ",":
+                pos += 1
+                continue
+
+            try:
+                item, fim = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # elemento incompleto: espera o próximo bloco
+            if c not in '{["' and (fim >= len(buf) or buf[fim] not in _DELIMITADORES):
+                # número/literal só termina no delimitador: cortado no fim
+                # do bloco, "1." de "1.5" decodificaria como 1
+                break
+            yield item
+            pos = fim
+
+        buf = buf[pos:]
+        pos = 0
+
+    raise ValueError(f"Resposta {fonte} truncada ou não é uma lista JSON")
+
+
+def iter_json_lista(url, fonte, timeout=None, metricas=None):
+    """
+    Versão streaming de get_json_lista: baixa com stream=True e devolve os
+    registros um a um enquanto o download ainda está em andamento.
+
+    Se `metricas` (dict) for informado, acumula em metricas["duracao"] o
+    tempo esperando a rede, em metricas["decode"] o tempo decodificando
+    e em metricas["bytes"] o tamanho baixado.
+    """
+    if metricas is None:
+        metricas = {}
+    metricas.setdefault("duracao", 0.0)
+    metricas.setdefault("decode", 0.0)
+    metricas.setdefault("bytes", 0)
+
+    def blocos(resposta):
+        it = resposta.iter_content(STREAM_CHUNK_BYTES)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                bloco = next(it)
+            except StopIteration:
+                metricas["duracao"] += time.perf_counter() - inicio
+                return
+            metricas["duracao"] += time.perf_counter() - inicio
+            metricas["bytes"] += len(bloco)
+            yield bloco
+
+    inicio = time.perf_counter()
+    r = get_session().get(url, timeout=timeout or REQUEST_TIMEOUT, stream=True)
+    with r:
+        r.raise_for_status()
+        metricas["duracao"] += time.perf_counter() - inicio
+        registros = iter_json_array(blocos(r), fonte, encoding=r.encoding or "utf-8")
+        while True:
+            inicio = time.perf_counter()
+            rede_antes = metricas["duracao"]
+            try:
+                item = next(registros)
+            except StopIteration:
+                return
+            finally:
+                # tempo dentro do parser que não foi espera de rede = decode
+                gasto = time.perf_counter() - inicio
+                metricas["decode"] += gasto - (metricas["duracao"] - rede_antes)
+            yield item
@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import Exists
+from django.utils import timezone
+
+from core.models import SyncJob, SyncRun
+from core.services.progresso import ler_progresso
+
+
+# o worker renova o batimento (updated_at) do job em execução a cada
+# JOB_BATIMENTO_SEG; sem batimento há JOB_TIMEOUT_MIN o job é órfão
+# (worker morreu no meio), por mais que a execução em si seja longa
+JOB_BATIMENTO_SEG = float(os.getenv("JOB_BATIMENTO_SEG", 30))
+JOB_TIMEOUT_MIN = int(os.getenv("JOB_TIMEOUT_MIN", 5))
+WORKER_INTERVALO = float(os.getenv("WORKER_INTERVALO", 2))
+
+
+# ======================================================
+# EXECUTORES (um por tipo de job)
+# ======================================================
+
+def _executar_sync_all(job):
+    call_command("sync_all")
+    return "Atualização concluída com sucesso.", {}
+
+
+@contextmanager
+def _sync_run(tipo):
+    """SyncRun do tipo informado: os serviços gravam nele um SyncDetail por etapa."""
+    run = SyncRun.objects.create(tipo=tipo, status="running")
+    inicio = time.perf_counter()
+    try:
+        yield run
+        run.status = "success"
+    except Exception as e:
+        run.status = "error"
+        run.mensagem = str(e)
+        raise
+    finally:
+        run.duracao_total = time.perf_counter() - inicio
+        run.save()
+
+
+def _executar_sync_bases(job):
+    from sincronizacao_user.services import (
+        sync_colaboradores_ponto, sync_usuarios_bitrix, garantir_checks_atualizados,
+    )
+
+    with _sync_run(SyncJob.TIPO_SYNC_BASES) as run:
+        msg_ponto = sync_colaboradores_ponto(run=run)
+        msg_bitrix = sync_usuarios_bitrix(run=run)
+        # regera os checks só se os loaders mudaram alguma linha
+        _, regerou = garantir_checks_atualizados(run=run)
+    msg_checks = "Checagem regerada." if regerou else "Bases sem alteração; checagem mantida."
+    return f"{msg_ponto} {msg_bitrix} {msg_checks}", {"checks_regerados": regerou}
+
+
+def _executar_run_sync(job):
+    from sincronizacao_user.services import garantir_checks_atualizados, enviar_cpfs_ok_do_check
+
+    with _sync_run(SyncJob.TIPO_RUN_SYNC) as run:
+        garantir_checks_atualizados(run=run)
+        resultado = enviar_cpfs_ok_do_check(run=run)
+
+    if resultado["atualizados"] > 0:
+        msg = f"{resultado['atualizados']} usuários tiveram CPFs atualizados no Bitrix."
+    else:
+        msg = "Nenhum CPF precisou ser atualizado nesta rodada."
+    if resultado["erros"] > 0:
+        msg += f" Atenção: {resultado['erros']} erros durante o envio."
+    return msg, resultado
+
+
+EXECUTORES = {
+    SyncJob.TIPO_SYNC_ALL: _executar_sync_all,
+    SyncJob.TIPO_SYNC_BASES: _executar_sync_bases,
+    SyncJob.TIPO_RUN_SYNC: _executar_run_sync,
+}
+
+
+# ======================================================
+# FILA
+# ======================================================
+
+def enfileirar(tipo, usuario=""):
+    """
+    Cria um job pendente. Se já existe um job ativo do mesmo tipo,
+    devolve esse em vez de criar outro. Retorna (job, criado).
+    """
+    ativo = (
+        SyncJob.objects
+        .filter(tipo=tipo, status__in=(SyncJob.STATUS_PENDENTE, SyncJob.STATUS_EXECUTANDO))
+        .order_by("created_at")
+        .first()
+    )
+    if ativo:
+        return ativo, False
+    return SyncJob.objects.create(tipo=tipo, solicitado_por=str(usuario or "")), True
+
+
+def liberar_travados():
+    """Marca como erro jobs 'executando' sem batimento há JOB_TIMEOUT_MIN (libera a trava)."""
+    limite = timezone.now() - timedelta(minutes=JOB_TIMEOUT_MIN)
+    return SyncJob.objects.filter(
+        status=SyncJob.STATUS_EXECUTANDO, updated_at__lt=limite
+    ).update(
+        status=SyncJob.STATUS_ERRO,
+        finalizado_em=timezone.now(),
+        mensagem=f"Sem batimento há {JOB_TIMEOUT_MIN} min; worker interrompido?",
+    )
+
+
+def registrar_batimento(job_id):
+    """Renova o updated_at de um job que ainda está executando."""
+    return SyncJob.objects.filter(
+        pk=job_id, status=SyncJob.STATUS_EXECUTANDO
+    ).update(updated_at=timezone.now())
+
+
+@contextmanager
+def batimento(job, intervalo=None):
+    """Thread que renova o batimento do job enquanto o bloco executa."""
+    intervalo = JOB_BATIMENTO_SEG if intervalo is None else intervalo
+    parar = threading.Event()
+
+    def bater():
+        try:
+            while not parar.wait(intervalo):
+                try:
+                    registrar_batimento(job.pk)
+                except DatabaseError as e:
+                    # ex.: SQLite travado por uma etapa longa; tenta no próximo
+                    print(f"⚠️ Batimento do job {job.id} falhou: {e}")
+        finally:
+            connections.close_all()
+
+    t = threading.Thread(target=bater, name=f"sync-job-{job.id}-batimento", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        t.join()
+
+
+def reivindicar_proximo():
+    """
+    Pega o job pendente mais antigo, desde que nenhum outro esteja executando.
+    A troca pendente -> executando é um único UPDATE condicional, então dois
+    workers (ou threads) nunca pegam o mesmo job nem rodam dois ao mesmo tempo.
+    """
+    liberar_travados()
+
+    pk = (
+        SyncJob.objects.filter(status=SyncJob.STATUS_PENDENTE)
+        .order_by("created_at", "id")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if pk is None:
+        return None
+
+    agora = timezone.now()
+    em_execucao = SyncJob.objects.filter(status=SyncJob.STATUS_EXECUTANDO)
+    pegou = (
+        SyncJob.objects
+        .filter(pk=pk, status=SyncJob.STATUS_PENDENTE)
+        .filter(~Exists(em_execucao))
+        .update(status=SyncJob.STATUS_EXECUTANDO, iniciado_em=agora, updated_at=agora)
+    )
+    return SyncJob.objects.get(pk=pk) if pegou else None
+
+
+def executar(job):
+    """Roda o job já reivindicado e grava o desfecho."""
+    print(f"▶ Job {job.id} ({job.tipo}) iniciado.")
+    try:
+        with batimento(job):
+            mensagem, resultado = EXECUTORES[job.tipo](job)
+        job.status = SyncJob.STATUS_SUCESSO
+    except Exception as e:
+        traceback.print_exc()
+        mensagem, resultado = f"Erro: {e}", {}
+        job.status = SyncJob.STATUS_ERRO
+
+    job.mensagem = mensagem
+    job.resultado = resultado
+    job.finalizado_em = timezone.now()
+    job.save(update_fields=["status", "mensagem", "resultado", "finalizado_em", "updated_at"])
+    print(f"■ Job {job.id} ({job.tipo}) terminou: {job.status}.")
+    return job
+
+
+def rodar_worker(intervalo=None, uma_vez=False, parar: threading.Event | None = None):
+    """
+    Loop do worker: reivindica e executa jobs até `parar` ser sinalizado.
+    Com uma_vez=True processa o que houver na fila e retorna.
+    """
+    intervalo = WORKER_INTERVALO if intervalo is None else intervalo
+    parar = parar or threading.Event()
+    processados = 0
+
+    while not parar.is_set():
+        close_old_connections()
+        job = reivindicar_proximo()
+        if job:
+            executar(job)
+            processados += 1
+            continue
+        if uma_vez:
+            break
+        parar.wait(intervalo)
+
+    close_old_connections()
+    return processados
+
+
+def iniciar_worker_em_thread():
+    """Sobe o worker numa thread daemon (usado pelo serve.py)."""
+    t = threading.Thread(target=rodar_worker, name="sync-worker", daemon=True)
+    t.start()
+    return t
+
+
+# ======================================================
+# STATUS / PROGRESSO
+# ======================================================
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+
+def status_job(job):
+    """Dict serializável com o estado do job e, para sync_all, o progresso por fonte."""
+    dados = {
+        "id": job.id,
+        "tipo": job.tipo,
+        "status": job.status,
+        "ativo": job.ativo,
+        "mensagem": job.mensagem,
+        "resultado": job.resultado,
+        "criado_em": _iso(job.created_at),
+        "iniciado_em": _iso(job.iniciado_em),
+        "finalizado_em": _iso(job.finalizado_em),
+        "run": None,
+    }
+
+    if job.tipo == SyncJob.TIPO_SYNC_ALL and job.iniciado_em:
+        runs = SyncRun.objects.filter(tipo="sync_all", created_at__gte=job.iniciado_em)
+        if job.finalizado_em:
+            runs = runs.filter(created_at__lte=job.finalizado_em)
+        run = runs.order_by("created_at").first()
+        if run:
+            dados["run"] = {
+                "id": run.id,
+                "status": run.status,
+                "mensagem": run.mensagem,
+                "etapas": [
+                    {
+                        "fonte": d.fonte,
+                        "lidos": d.lidos,
+                        "gravados": d.gravados,
+                        "ignorados": d.ignorados,
+                        "erro": d.mensagem_erro,
+                    }
+                    for d in run.details.order_by("created_at")
+                ],
+                "progresso": ler_progresso(run.id),
+            }
+
+    if job.iniciado_em:
+        fim = job.finalizado_em or timezone.now()
+        dados["duracao"] = round((fim - job.iniciado_em).total_seconds(), 1)
+    return dados
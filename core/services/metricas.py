@@ -0,0 +1,187 @@
+import threading
+from bisect import bisect_left
+
+from django.db.models import Count, Max, Sum
+
+
+# Métricas em memória, no formato texto do Prometheus, sem dependência
+# externa. Os histogramas/contadores são por processo (o waitress do
+# serve.py); os gauges de sync e de tabelas são lidos do banco na hora
+# da coleta, então valem para qualquer processo.
+
+BUCKETS_LATENCIA = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes, valores, extra=""):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(v):
+    if v is None:
+        return "NaN"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+class Contador:
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_rotulos, valor=1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            for chave, v in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(v)}")
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # rótulos -> [contagens por bucket (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_rotulos):
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][bisect_left(self.buckets, valor)] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            for chave, (contagens, soma) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, n in zip(self.buckets + ("+Inf",), contagens):
+                    acumulado += n
+                    le = 'le="%s"' % limite
+                    linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+                linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {soma}")
+                linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+def _gauge(nome, ajuda, amostras, rotulos=()):
+    """amostras: lista de (valores_rotulos, valor)."""
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge"]
+    for chave, v in amostras:
+        linhas.append(f"{nome}{_rotulos(rotulos, chave)} {_numero(v)}")
+    return linhas
+
+
+# ======================================================
+# MÉTRICAS DE REQUISIÇÃO (alimentadas pelo MetricasMiddleware)
+# ======================================================
+
+LATENCIA_VIEW = Histograma(
+    "django_view_duracao_segundos", "Latência das views por nome de rota.", ("view",),
+)
+QUERIES_VIEW = Histograma(
+    "django_view_queries", "Consultas SQL executadas por requisição.", ("view",), buckets=BUCKETS_QUERIES,
+)
+REQUISICOES = Contador(
+    "django_requisicoes_total", "Requisições atendidas por view e status HTTP.", ("view", "status"),
+)
+
+REGISTRO = [LATENCIA_VIEW, QUERIES_VIEW, REQUISICOES]
+
+
+# ======================================================
+# MÉTRICAS LIDAS DO BANCO
+# ======================================================
+
+def _metricas_banco():
+    from core.models import (
+        BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser,
+        ReconciliationResult, SyncRun, SyncDetail, SyncJob,
+    )
+    from sincronizacao_user.models import ColaboradorPonto, UsuarioBitrix, MatchCPFCheck, LogAtualizacaoCPF
+
+    linhas = []
+
+    # último SyncDetail de cada fonte (uma consulta para os ids + uma para os dados)
+    ultimos_ids = SyncDetail.objects.values("fonte").annotate(ultimo=Max("id")).values_list("ultimo", flat=True)
+    ultimos = list(SyncDetail.objects.filter(id__in=list(ultimos_ids)).order_by("fonte"))
+    linhas += _gauge(
+        "sync_fonte_ultima_duracao_segundos", "Duração total da última sincronização da fonte.",
+        [((d.fonte,), d.duracao_total) for d in ultimos], ("fonte",),
+    )
+    linhas += _gauge(
+        "sync_fonte_ultimo_sucesso", "1 se a última sincronização da fonte terminou sem erro.",
+        [((d.fonte,), 0 if d.mensagem_erro else 1) for d in ultimos], ("fonte",),
+    )
+    linhas += _gauge(
+        "sync_fonte_ultimo_timestamp_segundos", "Horário (epoch) da última sincronização da fonte.",
+        [((d.fonte,), round(d.created_at.timestamp(), 3)) for d in ultimos], ("fonte",),
+    )
+    linhas += _gauge(
+        "sync_fonte_ultimas_linhas", "Registros lidos na última sincronização da fonte.",
+        [((d.fonte,), d.lidos) for d in ultimos], ("fonte",),
+    )
+
+    ultimos_runs = SyncRun.objects.values("tipo").annotate(ultimo=Max("id")).values_list("ultimo", flat=True)
+    runs = list(SyncRun.objects.filter(id__in=list(ultimos_runs)).order_by("tipo"))
+    linhas += _gauge(
+        "sync_run_ultima_duracao_segundos", "Duração da última execução por tipo.",
+        [((r.tipo, r.status), r.duracao_total) for r in runs], ("tipo", "status"),
+    )
+    linhas += _gauge(
+        "sync_run_ultimo_sucesso", "1 se a última execução do tipo terminou com sucesso.",
+        [((r.tipo,), 1 if r.status == "success" else 0) for r in runs], ("tipo",),
+    )
+
+    # webhook do Bitrix: ENVIO_CPF registra enviados (lidos) e aceitos (gravados)
+    envio = SyncDetail.objects.filter(fonte="ENVIO_CPF").aggregate(enviados=Sum("lidos"), aceitos=Sum("gravados"))
+    enviados, aceitos = envio["enviados"] or 0, envio["aceitos"] or 0
+    linhas += [
+        "# HELP bitrix_webhook_envios_total Envios de CPF ao webhook do Bitrix por resultado.",
+        "# TYPE bitrix_webhook_envios_total counter",
+        f'bitrix_webhook_envios_total{{resultado="sucesso"}} {aceitos}',
+        f'bitrix_webhook_envios_total{{resultado="erro"}} {enviados - aceitos}',
+    ]
+    linhas += _gauge(
+        "bitrix_cpf_log_registros", "Linhas em LogAtualizacaoCPF.", [((), LogAtualizacaoCPF.objects.count())],
+    )
+
+    tabelas = [
+        BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser,
+        ReconciliationResult, ColaboradorPonto, UsuarioBitrix, MatchCPFCheck,
+    ]
+    linhas += _gauge(
+        "tabela_linhas", "Quantidade de linhas por tabela local.",
+        [((m._meta.db_table,), m.objects.count()) for m in tabelas], ("tabela",),
+    )
+
+    jobs = dict(SyncJob.objects.values_list("status").annotate(n=Count("id")))
+    linhas += _gauge(
+        "sync_jobs", "Jobs na fila por status.",
+        [((s,), jobs.get(s, 0)) for s, _ in SyncJob.STATUS_CHOICES], ("status",),
+    )
+    return linhas
+
+
+def exportar():
+    """Texto completo no formato de exposição do Prometheus (text/plain 0.0.4)."""
+    linhas = []
+    for metrica in REGISTRO:
+        linhas += metrica.exportar()
+    linhas += _metricas_banco()
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,51 @@
+# Paginação por chave (keyset/seek): em vez de OFFSET, cada página começa
+# logo depois (ou antes) do último id visto. O custo de qualquer página é
+# o mesmo da primeira, e inserções durante a navegação não "pulam" linhas.
+
+
+class PaginaKeyset:
+    def __init__(self, itens, tem_anterior, tem_proxima):
+        self.itens = itens
+        self.tem_anterior = tem_anterior
+        self.tem_proxima = tem_proxima
+
+    @property
+    def cursor_anterior(self):
+        return self.itens[0].pk if self.itens and self.tem_anterior else None
+
+    @property
+    def cursor_proximo(self):
+        return self.itens[-1].pk if self.itens and self.tem_proxima else None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def _cursor(valor):
+    try:
+        return int(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def paginar_keyset(qs, tamanho, apos=None, antes=None):
+    """
+    Uma página de `qs` ordenada pela pk. `apos` avança (pk > cursor);
+    `antes` volta (pk < cursor). Busca `tamanho + 1` linhas para saber se
+    há outra página sem precisar de COUNT. Cursores inválidos = 1ª página.
+    """
+    apos, antes = _cursor(apos), _cursor(antes)
+
+    if antes is not None:
+        itens = list(qs.filter(pk__lt=antes).order_by("-pk")[: tamanho + 1])
+        tem_anterior = len(itens) > tamanho
+        itens = itens[:tamanho][::-1]
+        return PaginaKeyset(itens, tem_anterior, tem_proxima=True)
+
+    if apos is not None:
+        qs = qs.filter(pk__gt=apos)
+    itens = list(qs.order_by("pk")[: tamanho + 1])
+    return PaginaKeyset(itens[:tamanho], tem_anterior=apos is not None, tem_proxima=len(itens) > tamanho)
@@ -0,0 +1,56 @@
+import heapq
+import time
+
+
+class OrcamentoSQLExcedido(Exception):
+    """Requisição passou do número de consultas declarado para a view."""
+
+
+class PerfilSQL:
+    """
+    Wrapper para connection.execute_wrapper: conta as consultas, soma o
+    tempo gasto no banco e guarda as `top` mais lentas.
+    """
+
+    def __init__(self, top=5):
+        self.consultas = 0
+        self.tempo = 0.0  # segundos
+        self.top = top
+        self._lentas = []  # heap (duracao, seq, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            self.consultas += 1
+            self.tempo += duracao
+            item = (duracao, self.consultas, sql)
+            if len(self._lentas) < self.top:
+                heapq.heappush(self._lentas, item)
+            elif duracao > self._lentas[0][0]:
+                heapq.heapreplace(self._lentas, item)
+
+    @property
+    def mais_lentas(self):
+        """[(ms, sql)] da mais lenta para a mais rápida."""
+        return [(round(d * 1000, 2), sql) for d, _, sql in sorted(self._lentas, reverse=True)]
+
+    def resumo(self):
+        linhas = [f"{self.consultas} consultas, {self.tempo * 1000:.1f} ms no banco"]
+        for ms, sql in self.mais_lentas:
+            linhas.append(f"  {ms:>8.2f} ms  {sql[:300]}")
+        return "\n".join(linhas)
+
+
+def orcamento_sql(maximo):
+    """
+    Declara o máximo de consultas SQL que a view pode fazer por requisição.
+    O PerfilSQLMiddleware loga quem estourar (ou lança exceção no modo
+    estrito, usado nos testes). Aplique antes de login_required & cia.
+    """
+    def decorador(view):
+        view.orcamento_sql = maximo
+        return view
+    return decorador
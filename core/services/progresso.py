@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+# As etapas de gravação rodam dentro de transaction.atomic, então progresso
+# gravado no banco só ficaria visível no commit. Por isso o progresso vive
+# num arquivo JSON por execução (escrita atômica via os.replace).
+PROGRESSO_DIR = os.getenv("PROGRESSO_DIR") or os.path.join(tempfile.gettempdir(), "sync_progresso")
+PROGRESSO_INTERVALO = float(os.getenv("PROGRESSO_INTERVALO", 0.5))  # s entre gravações
+
+
+def _caminho(run_id):
+    return os.path.join(PROGRESSO_DIR, f"run_{run_id}.json")
+
+
+def ler_progresso(run_id):
+    """Último estado gravado da execução (dict) ou None se não houver."""
+    try:
+        with open(_caminho(run_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Progresso:
+    """
+    Registro leve do andamento de um sync: por fonte, a fase atual
+    (download, gravacao, conciliacao, concluido, erro), linhas processadas
+    e tempo decorrido. Thread-safe (os downloads correm em paralelo) e
+    com gravação limitada a uma a cada PROGRESSO_INTERVALO segundos,
+    exceto em troca de fase.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._ultima_gravacao = 0.0
+        self.estado = {
+            "run": run_id,
+            "status": "running",
+            "inicio": time.time(),
+            "atualizado_em": time.time(),
+            "etapa_atual": None,
+            "fontes": {},
+        }
+        self._gravar(forcar=True)
+
+    def iniciar(self, fonte, fase):
+        with self._lock:
+            agora = time.time()
+            # guarda o tempo das fases anteriores da mesma fonte (ex.: download)
+            anterior = self.estado["fontes"].get(fonte)
+            fases = dict(anterior["fases"]) if anterior else {}
+            if anterior:
+                fases[anterior["fase"].removesuffix("_ok")] = anterior["decorrido"]
+            self.estado["fontes"][fonte] = {
+                "fase": fase, "linhas": 0, "inicio": agora, "decorrido": 0.0, "erro": "", "fases": fases,
+            }
+            self.estado["etapa_atual"] = f"{fonte}:{fase}"
+            self._gravar(forcar=True)
+
+    def avancar(self, fonte, linhas):
+        with self._lock:
+            f = self.estado["fontes"].get(fonte)
+            if f is None:
+                return
+            f["linhas"] = linhas
+            f["decorrido"] = round(time.time() - f["inicio"], 2)
+            self._gravar()
+
+    def concluir(self, fonte, linhas=None):
+        with self._lock:
+            f = self.estado["fontes"].get(fonte)
+            if f is None:
+                return
+            if linhas is not None:
+                f["linhas"] = linhas
+            f["decorrido"] = round(time.time() - f["inicio"], 2)
+            f["fase"] = f"{f['fase']}_ok"
+            self._gravar(forcar=True)
+
+    def falhar(self, fonte, erro):
+        with self._lock:
+            f = self.estado["fontes"].setdefault(
+                fonte, {"fase": "erro", "linhas": 0, "inicio": time.time(), "decorrido": 0.0, "fases": {}}
+            )
+            f["fase"] = "erro"
+            f["erro"] = str(erro)[:500]
+            f["decorrido"] = round(time.time() - f["inicio"], 2)
+            self._gravar(forcar=True)
+
+    def finalizar(self, status):
+        with self._lock:
+            self.estado["status"] = status
+            self.estado["etapa_atual"] = None
+            self._gravar(forcar=True)
+
+    def _gravar(self, forcar=False):
+        agora = time.time()
+        if not forcar and agora - self._ultima_gravacao < PROGRESSO_INTERVALO:
+            return
+        self._ultima_gravacao = agora
+        self.estado["atualizado_em"] = agora
+        try:
+            os.makedirs(PROGRESSO_DIR, exist_ok=True)
+            destino = _caminho(self.run_id)
+            tmp = f"{destino}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.estado, f)
+            os.replace(tmp, destino)
+        except OSError as e:
+            # progresso é só informativo: nunca derruba o sync
+            print(f"⚠️ Não foi possível gravar o progresso: {e}")
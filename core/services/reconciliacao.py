@@ -0,0 +1,222 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from core.models import (
+    BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser,
+    ReconciliationResult,
+)
+
+
+FONTES = ReconciliationResult.FONTES
+
+# fonte -> (modelo, campo usado como chave de conciliação)
+CHAVES_FONTES = {
+    "ponto": (PontoContact, "nome_completo"),
+    "gestta": (GesttaUser, "email"),
+    "dominio": (DominioAccount, "nome"),
+    "web": (CcontrolWebUser, "email"),
+    "visao": (VisaoLogicaUser, "nome_funcionario"),
+}
+
+# fonte -> campo do BitrixUser comparado com a chave da fonte
+CAMPO_BITRIX = {
+    "ponto": "nome_completo",
+    "gestta": "email",
+    "dominio": "user_dominio",
+    "web": "email",
+    "visao": "user_local",
+}
+
+
+def contar_chaves(fonte):
+    """Counter {chave: quantidade} da fonte (uma consulta)."""
+    modelo, campo = CHAVES_FONTES[fonte]
+    return Counter(modelo.objects.values_list(campo, flat=True))
+
+
+class IndiceFontes:
+    """
+    Carrega cada tabela de fonte UMA única vez em memória, indexada pelo
+    campo usado na conciliação. Assim a validação de N usuários custa
+    sempre as mesmas 5 consultas, independente de N.
+    """
+
+    def __init__(self):
+        # Ponto precisa da contagem (detecta duplicidade de nome)
+        self.ponto = contar_chaves("ponto")
+        self.gestta = set(contar_chaves("gestta"))
+        self.dominio = set(contar_chaves("dominio"))
+        self.web = set(contar_chaves("web"))
+        self.visao = set(contar_chaves("visao"))
+
+
+def validar_usuario(u, indice: IndiceFontes):
+    #Retorna dict com status de cada fonte e motivo se falha.
+    result = {
+        "ponto": (False, "sem verificação"),
+        "gestta": (False, "sem verificação"),
+        "dominio": (False, "sem verificação"),
+        "web": (False, "sem verificação"),
+        "visao": (False, "sem verificação"),
+    }
+
+    # se Bitrix não fornece email, permanece None
+    email_b = u.email or None
+
+    # Ponto: validação apenas pelo nome
+    if not u.nome_completo:
+        result["ponto"] = (False, "BITRIX sem nome para conciliar")
+    else:
+        count = indice.ponto.get(u.nome_completo, 0)
+        if count == 1:
+            result["ponto"] = (True, "")
+        elif count == 0:
+            result["ponto"] = (False, "Ponto: nenhum registro com esse nome")
+        else:
+            result["ponto"] = (False, f"Ponto: duplicidade ({count} registros com mesmo nome)")
+
+    # GESTTA: apenas e-mail
+    if email_b is None:
+        result["gestta"] = (False, "BITRIX sem e-mail")
+    else:
+        exists = email_b in indice.gestta
+        result["gestta"] = (exists, "Gestta: e-mail não encontrado" if not exists else "")
+
+    # DOMÍNIO: user_dominio deve existir em DominioAccount.nome
+    if not u.user_dominio:
+        result["dominio"] = (False, "BITRIX sem User_Dominio")
+    else:
+        exists = u.user_dominio in indice.dominio
+        result["dominio"] = (exists, "Domínio: user não encontrado" if not exists else "")
+
+    # CCONTROLWEB: e-mail
+    if email_b is None:
+        result["web"] = (False, "BITRIX sem e-mail")
+    else:
+        exists = email_b in indice.web
+        result["web"] = (exists, "Web: e-mail não encontrado" if not exists else "")
+
+    # Visão Lógica: nome deve existir em VisaoLogicaUser.nome_funcionario
+    if not u.user_local:
+        result["visao"] = (False, "BITRIX sem nome para conciliar")
+    else:
+        exists = u.user_local in indice.visao
+        result["visao"] = (exists, "Visão Lógica: nome não encontrado" if not exists else "")
+
+    return result
+
+
+def validar_usuarios(users, indice: IndiceFontes | None = None):
+    """
+    Valida vários BitrixUser de uma vez.
+    Retorna lista de tuplas (usuario, validacoes) na mesma ordem de `users`.
+    """
+    if indice is None:
+        indice = IndiceFontes()
+    return [(u, validar_usuario(u, indice)) for u in users]
+
+
+def _resultado_de(u, v):
+    campos = {}
+    for fonte in FONTES:
+        ok, motivo = v[fonte]
+        campos[f"{fonte}_ok"] = ok
+        campos[f"{fonte}_motivo"] = motivo[:255]
+    return ReconciliationResult(bitrix_user=u, **campos)
+
+
+@transaction.atomic
+def reconstruir_resultados(users=None, batch_size=500):
+    """
+    (Re)grava ReconciliationResult para os usuários informados
+    (padrão: todos os BitrixUser). Retorna quantas linhas foram gravadas.
+    """
+    if users is None:
+        users = BitrixUser.objects.all()
+
+    objs = [_resultado_de(u, v) for u, v in validar_usuarios(users)]
+
+    update_fields = ["updated_at"]
+    for fonte in FONTES:
+        update_fields += [f"{fonte}_ok", f"{fonte}_motivo"]
+
+    ReconciliationResult.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["bitrix_user"],
+        update_fields=update_fields,
+    )
+    return len(objs)
+
+
+def garantir_resultados(users=None):
+    """
+    Calcula o resultado apenas de quem ainda não tem linha materializada
+    (ex.: base nunca sincronizada depois da criação da tabela).
+    `users` restringe a checagem a um queryset (ex.: a página visível).
+    """
+    if users is None:
+        users = BitrixUser.objects.all()
+    # lista (uma consulta): vazia no caso comum, sem EXISTS + SELECT
+    pendentes = list(users.filter(reconciliacao__isnull=True))
+    if not pendentes:
+        return 0
+    return reconstruir_resultados(pendentes)
+
+
+class RastreadorAlteracoes:
+    """
+    Guarda, por fonte, as chaves de conciliação que mudaram durante um sync.
+
+    Compara a contagem de cada chave antes e depois da gravação: inserções,
+    atualizações e exclusões que alteram a presença (ou a duplicidade) de
+    uma chave entram no conjunto; regravações sem efeito na chave, não.
+
+    Mudanças do lado do Bitrix não passam por aqui: o sync grava o
+    BitrixUser alterado como remoção + inserção (novo pk, sem resultado),
+    e reconciliar_incremental recalcula quem não tem resultado.
+    """
+
+    def __init__(self):
+        self.chaves = {fonte: set() for fonte in FONTES}
+
+    @contextmanager
+    def observar(self, fonte):
+        antes = contar_chaves(fonte)
+        try:
+            yield
+        finally:
+            # mesmo se a gravação falhar no meio (streaming grava por lote)
+            depois = contar_chaves(fonte)
+            self.chaves[fonte] |= {k for k in antes.keys() | depois.keys() if antes[k] != depois[k]}
+
+    def afeta(self, u):
+        for fonte in FONTES:
+            valor = getattr(u, CAMPO_BITRIX[fonte])
+            if valor and valor in self.chaves[fonte]:
+                return True
+        return False
+
+
+def reconciliar_incremental(alteracoes: RastreadorAlteracoes):
+    """
+    Recalcula só os BitrixUser sem resultado materializado ou cujas chaves
+    cruzam o conjunto de alterações. Retorna (recalculados, ignorados).
+    """
+    com_resultado = set(ReconciliationResult.objects.values_list("bitrix_user_id", flat=True))
+    users = BitrixUser.objects.only("id", *set(CAMPO_BITRIX.values()))
+
+    alvos = []
+    ignorados = 0
+    for u in users:
+        if u.pk not in com_resultado or alteracoes.afeta(u):
+            alvos.append(u)
+        else:
+            ignorados += 1
+
+    if alvos:
+        reconstruir_resultados(alvos)
+    return len(alvos), ignorados
@@ -0,0 +1,46 @@
+"""
+Ajudantes de teste para o orçamento de SQL das views.
+
+    from core.testing import OrcamentoSQLTestMixin, limite_consultas
+
+    class DashboardTests(OrcamentoSQLTestMixin, TestCase):
+        def test_dashboard(self):
+            self.client.force_login(self.staff)
+            self.assertDentroDoOrcamento(reverse("core:dashboard"))
+
+        def test_servico(self):
+            with limite_consultas(5):
+                garantir_resultados()
+"""
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import override_settings
+
+from core.services.perfil_sql import OrcamentoSQLExcedido, PerfilSQL
+
+
+@contextmanager
+def limite_consultas(maximo, using="default"):
+    """Falha (AssertionError) se o bloco fizer mais que `maximo` consultas."""
+    perfil = PerfilSQL()
+    with connections[using].execute_wrapper(perfil):
+        yield perfil
+    if perfil.consultas > maximo:
+        raise AssertionError(f"{perfil.consultas} consultas (máximo {maximo})\n{perfil.resumo()}")
+
+
+class OrcamentoSQLTestMixin:
+    """
+    Para django.test.TestCase: faz a requisição com o PerfilSQLMiddleware
+    em modo estrito, então a view que passar do @orcamento_sql declarado
+    derruba o teste com o resumo das consultas.
+    """
+
+    def assertDentroDoOrcamento(self, url, metodo="get", client=None, **kwargs):
+        client = client or self.client
+        with override_settings(SQL_ORCAMENTO_ESTRITO=True):
+            try:
+                return getattr(client, metodo)(url, **kwargs)
+            except OrcamentoSQLExcedido as e:
+                self.fail(str(e))
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import (
+    BitrixUser, PontoContact, GesttaUser, DominioAccount, ReconciliationResult, SyncJob, SyncRun,
+)
+from core.services.bulk import bulk_upsert, sincronizar_diff
+from core.services.cache_dashboard import contadores_divergencia
+from core.services.http import iter_json_array
+from core.services.jobs import JOB_TIMEOUT_MIN, registrar_batimento, reivindicar_proximo
+from core.services.paginacao import paginar_keyset
+from core.testing import OrcamentoSQLTestMixin, limite_consultas
+from core.services.reconciliacao import (
+    RastreadorAlteracoes, garantir_resultados, reconciliar_incremental, reconstruir_resultados,
+)
+
+
+def criar_bitrix(nome, email=None, status="Ativo", **extra):
+    return BitrixUser.objects.create(
+        status=status, nome_user=nome, nome_completo=nome, email=email, **extra
+    )
+
+
+# ======================================================
+# CONCILIAÇÃO INCREMENTAL
+# ======================================================
+
+class ReconciliacaoIncrementalTests(TestCase):
+    def setUp(self):
+        self.ana = criar_bitrix("Ana", "ana@x")
+        self.bia = criar_bitrix("Bia", "bia@x")
+        reconstruir_resultados()
+
+    def resultado(self, u):
+        return ReconciliationResult.objects.get(bitrix_user=u)
+
+    def test_recalcula_so_quem_a_chave_alterada_afeta(self):
+        alteracoes = RastreadorAlteracoes()
+        with alteracoes.observar("ponto"):
+            PontoContact.objects.create(nome_completo="Ana", status_ponto="A")
+
+        recalculados, ignorados = reconciliar_incremental(alteracoes)
+
+        self.assertEqual((recalculados, ignorados), (1, 1))
+        self.assertTrue(self.resultado(self.ana).ponto_ok)
+        self.assertFalse(self.resultado(self.bia).ponto_ok)
+
+    def test_duplicidade_nova_tambem_conta_como_alteracao(self):
+        PontoContact.objects.create(nome_completo="Ana", status_ponto="A")
+        reconstruir_resultados()
+
+        alteracoes = RastreadorAlteracoes()
+        with alteracoes.observar("ponto"):
+            PontoContact.objects.create(nome_completo="Ana", status_ponto="B")
+        reconciliar_incremental(alteracoes)
+
+        r = self.resultado(self.ana)
+        self.assertFalse(r.ponto_ok)
+        self.assertIn("duplicidade", r.ponto_motivo)
+
+    def test_regravacao_sem_mudar_chave_nao_recalcula(self):
+        GesttaUser.objects.create(name="Ana", email="ana@x")
+        reconstruir_resultados()
+
+        alteracoes = RastreadorAlteracoes()
+        with alteracoes.observar("gestta"):
+            GesttaUser.objects.filter(email="ana@x").update(name="Ana Maria")
+
+        self.assertEqual(reconciliar_incremental(alteracoes), (0, 2))
+
+    def test_usuario_sem_resultado_e_calculado(self):
+        # BitrixUser alterado chega como remoção + inserção (pk novo)
+        self.ana.delete()
+        nova = criar_bitrix("Ana", "ana@novo")
+
+        recalculados, _ = reconciliar_incremental(RastreadorAlteracoes())
+
+        self.assertEqual(recalculados, 1)
+        self.assertTrue(ReconciliationResult.objects.filter(bitrix_user=nova).exists())
+
+
+# ======================================================
+# GRAVAÇÃO EM LOTE
+# ======================================================
+
+class BulkUpsertTests(TestCase):
+    def contas(self, *pares):
+        return [DominioAccount(id_externo=i, nome=n) for i, n in pares]
+
+    def test_insere_e_depois_atualiza(self):
+        self.assertEqual(bulk_upsert(
+            DominioAccount, self.contas((1, "a"), (2, "b"), (3, "c")),
+            unique_field="id_externo", update_fields=["nome"], chunk_size=2,
+        ), (3, 0))
+
+        criados, atualizados = bulk_upsert(
+            DominioAccount, iter(self.contas((2, "B"), (3, "C"), (4, "d"))),
+            unique_field="id_externo", update_fields=["nome"], chunk_size=2,
+        )
+
+        self.assertEqual((criados, atualizados), (1, 2))
+        self.assertEqual(
+            dict(DominioAccount.objects.values_list("id_externo", "nome")),
+            {1: "a", 2: "B", 3: "C", 4: "d"},
+        )
+
+    def test_chave_repetida_no_lote_fica_com_a_ultima(self):
+        criados, atualizados = bulk_upsert(
+            DominioAccount, self.contas((1, "primeiro"), (1, "ultimo")),
+            unique_field="id_externo", update_fields=["nome"],
+        )
+
+        self.assertEqual((criados, atualizados), (1, 1))
+        self.assertEqual(DominioAccount.objects.get().nome, "ultimo")
+
+    def test_atualiza_campos_auto_now(self):
+        bulk_upsert(DominioAccount, self.contas((1, "a")), unique_field="id_externo", update_fields=["nome"])
+        antes = DominioAccount.objects.get().updated_at
+
+        bulk_upsert(DominioAccount, self.contas((1, "b")), unique_field="id_externo", update_fields=["nome"])
+
+        self.assertGreater(DominioAccount.objects.get().updated_at, antes)
+
+
+class SincronizarDiffTests(TestCase):
+    def contas(self, *pares):
+        return [DominioAccount(id_externo=i, nome=n, fonte_raw={"NOME": n}) for i, n in pares]
+
+    def sincronizar(self, *pares):
+        return sincronizar_diff(
+            DominioAccount, iter(self.contas(*pares)),
+            campos=["id_externo", "nome"], chave="id_externo", chunk_size=2,
+        )
+
+    def test_com_chave_grava_so_a_diferenca(self):
+        self.sincronizar((1, "a"), (2, "b"), (3, "c"))
+        pk_b = DominioAccount.objects.get(id_externo=2).pk
+
+        res = self.sincronizar((2, "B"), (3, "c"), (4, "d"))
+
+        self.assertEqual(
+            res, {"inseridos": 1, "atualizados": 1, "removidos": 1, "inalterados": 1, "duplicados": 0},
+        )
+        self.assertEqual(
+            dict(DominioAccount.objects.values_list("id_externo", "nome")),
+            {2: "B", 3: "c", 4: "d"},
+        )
+        # atualização preserva o pk
+        self.assertEqual(DominioAccount.objects.get(id_externo=2).pk, pk_b)
+
+    def test_com_chave_repetida_fica_a_ultima(self):
+        res = self.sincronizar((1, "a"), (2, "b"), (1, "outro"))
+
+        self.assertEqual(res["inseridos"], 2)
+        self.assertEqual(res["duplicados"], 1)
+        self.assertEqual(DominioAccount.objects.get(id_externo=1).nome, "outro")
+
+    def test_com_chave_repetida_em_outro_lote_tambem_prevalece(self):
+        self.sincronizar((1, "a"))
+
+        # chunk_size=2: a repetição chega no segundo lote, depois da gravação
+        res = self.sincronizar((1, "b"), (2, "x"), (1, "c"), (1, "b"))
+
+        self.assertEqual(
+            res, {"inseridos": 1, "atualizados": 1, "removidos": 0, "inalterados": 0, "duplicados": 2},
+        )
+        self.assertEqual(DominioAccount.objects.get(id_externo=1).nome, "b")
+        self.assertEqual(DominioAccount.objects.count(), 2)
+
+    def test_sem_chave_respeita_nomes_repetidos(self):
+        def contatos(*nomes):
+            return (PontoContact(nome_completo=n, status_ponto="A", fonte_raw={}) for n in nomes)
+
+        campos = ["nome_completo", "status_ponto"]
+        sincronizar_diff(PontoContact, contatos("Ana", "Ana", "Bia"), campos)
+
+        res = sincronizar_diff(PontoContact, contatos("Ana", "Bia", "Caio"), campos)
+
+        self.assertEqual(
+            res, {"inseridos": 1, "atualizados": 0, "removidos": 1, "inalterados": 2, "duplicados": 0},
+        )
+        self.assertEqual(
+            sorted(PontoContact.objects.values_list("nome_completo", flat=True)),
+            ["Ana", "Bia", "Caio"],
+        )
+
+
+# ======================================================
+# JSON EM STREAMING
+# ======================================================
+
+def em_blocos(dados, tamanho):
+    return (dados[i:i + tamanho] for i in range(0, len(dados), tamanho))
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    def ler(self, texto, tamanho):
+        return list(iter_json_array(em_blocos(texto.encode("utf-8"), tamanho), "TESTE"))
+
+    def test_numero_cortado_no_fim_do_bloco(self):
+        for tamanho in (1, 2, 3, 4, 64):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(self.ler("[1.5]", tamanho), [1.5])
+                self.assertEqual(self.ler("[12, -3e2 ,true,null]", tamanho), [12, -300.0, True, None])
+
+    def test_qualquer_corte_devolve_os_mesmos_elementos(self):
+        dados = [{"nome": "João", "id": 123}, "a,]b", [1, [2]], 0.25, "ç"]
+        texto = json.dumps(dados, ensure_ascii=False)
+        for tamanho in range(1, len(texto.encode("utf-8")) + 1):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(self.ler(texto, tamanho), dados)
+
+    def test_truncado_ou_nao_lista_levanta_erro(self):
+        for texto in ("[1, 2", "[1.", '{"a": 1}', ""):
+            with self.subTest(texto=texto), self.assertRaises(ValueError):
+                self.ler(texto, 2)
+
+
+# ======================================================
+# FILA DE JOBS
+# ======================================================
+
+class FilaJobsTests(TestCase):
+    def job(self, status=SyncJob.STATUS_PENDENTE, tipo=SyncJob.TIPO_SYNC_ALL):
+        return SyncJob.objects.create(tipo=tipo, status=status)
+
+    def envelhecer(self, job, minutos):
+        # update() direto: save() renovaria o updated_at
+        passado = timezone.now() - timedelta(minutes=minutos)
+        SyncJob.objects.filter(pk=job.pk).update(iniciado_em=passado, updated_at=passado)
+
+    def test_reivindica_o_pendente_mais_antigo(self):
+        primeiro = self.job()
+        self.job(tipo=SyncJob.TIPO_RUN_SYNC)
+
+        job = reivindicar_proximo()
+
+        self.assertEqual(job.pk, primeiro.pk)
+        self.assertEqual(job.status, SyncJob.STATUS_EXECUTANDO)
+        self.assertIsNotNone(job.iniciado_em)
+
+    def test_nao_reivindica_com_outro_executando(self):
+        self.job(status=SyncJob.STATUS_EXECUTANDO)
+        self.job()
+
+        self.assertIsNone(reivindicar_proximo())
+        self.assertIsNone(reivindicar_proximo())
+        self.assertEqual(SyncJob.objects.filter(status=SyncJob.STATUS_EXECUTANDO).count(), 1)
+
+    def test_fila_vazia(self):
+        self.assertIsNone(reivindicar_proximo())
+
+    def test_job_com_batimento_recente_segura_a_trava(self):
+        longo = self.job(status=SyncJob.STATUS_EXECUTANDO)
+        self.envelhecer(longo, JOB_TIMEOUT_MIN * 10)
+        registrar_batimento(longo.pk)
+        self.job()
+
+        self.assertIsNone(reivindicar_proximo())
+        longo.refresh_from_db()
+        self.assertEqual(longo.status, SyncJob.STATUS_EXECUTANDO)
+
+    def test_job_sem_batimento_e_liberado(self):
+        orfao = self.job(status=SyncJob.STATUS_EXECUTANDO)
+        self.envelhecer(orfao, JOB_TIMEOUT_MIN + 1)
+        pendente = self.job()
+
+        self.assertEqual(reivindicar_proximo().pk, pendente.pk)
+        orfao.refresh_from_db()
+        self.assertEqual(orfao.status, SyncJob.STATUS_ERRO)
+
+
+# ======================================================
+# VIEWS
+# ======================================================
+
+class SyncHistoricoTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("adm", is_staff=True))
+        self.url = reverse("core:sync_historico")
+
+    def test_dias_invalido_responde_400(self):
+        self.assertEqual(self.client.get(self.url, {"dias": "abc"}).status_code, 400)
+        resp = self.client.get(self.url, {"dias": "abc", "formato": "json"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json(), {"erro": "dias inválido"})
+
+    def test_dias_fora_da_faixa_e_limitado(self):
+        for dias in ("0", "-5", "99999999999"):
+            with self.subTest(dias=dias):
+                resp = self.client.get(self.url, {"dias": dias, "formato": "json"})
+                self.assertEqual(resp.status_code, 200)
+
+
+class SyncProgressoTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("adm", is_staff=True))
+        self.url = reverse("core:sync_progresso")
+
+    def eventos(self):
+        resp = self.client.get(self.url)
+        return b"".join(resp.streaming_content).decode()
+
+    def test_sync_concluido_encerra_com_fim(self):
+        SyncRun.objects.create(status="success")
+        self.assertTrue(self.eventos().endswith('event: fim\ndata: {"motivo": "concluido"}\n\n'))
+
+    def test_tempo_esgotado_tambem_avisa_o_fim(self):
+        SyncRun.objects.create(status="running")
+        with mock.patch("core.views.SSE_MAX_SEGUNDOS", 0):
+            self.assertTrue(self.eventos().endswith('event: fim\ndata: {"motivo": "tempo"}\n\n'))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.url = reverse("core:metrics")
+
+    @override_settings(METRICS_TOKEN="")
+    def test_sem_token_so_atende_local(self):
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR="10.0.0.5").status_code, 403)
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR="127.0.0.1").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_sem_token_recusa_quem_vem_pelo_proxy_local(self):
+        resp = self.client.get(self.url, REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR="10.0.0.5")
+        self.assertEqual(resp.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="segredo")
+    def test_com_token_exige_o_token(self):
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR="127.0.0.1").status_code, 401)
+        resp = self.client.get(self.url, REMOTE_ADDR="10.0.0.5", HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(METRICS_TOKEN="segredo")
+    def test_token_na_url_nao_vale(self):
+        self.assertEqual(self.client.get(self.url, {"token": "segredo"}).status_code, 401)
+
+
+CACHE_LOCAL = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "testes"}}
+
+
+@override_settings(CACHES=CACHE_LOCAL, DASHBOARD_PAGE_SIZE=2)
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user("adm", is_staff=True))
+        for i in range(5):
+            criar_bitrix(f"U{i}", f"u{i}@x")
+        criar_bitrix("Inativo", status="Inativo")
+
+    def test_contadores_contam_todos_os_ativos_nao_so_a_pagina(self):
+        GesttaUser.objects.create(name="U0", email="u0@x")
+
+        resp = self.client.get(reverse("core:dashboard"))
+
+        self.assertEqual(len(resp.context["rows"]), 2)
+        self.assertEqual(resp.context["cont_div"]["ponto"], 5)
+        self.assertEqual(resp.context["cont_div"]["gestta"], 4)
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ContadoresDivergenciaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_contagem_parcial_nao_vai_para_o_cache(self):
+        ana = criar_bitrix("Ana")
+        reconstruir_resultados([ana])
+        criar_bitrix("Bia")
+
+        self.assertEqual(contadores_divergencia(1)["ponto"], 1)
+
+        garantir_resultados()
+        self.assertEqual(contadores_divergencia(1)["ponto"], 2)
+
+    def test_contagem_completa_fica_em_cache(self):
+        criar_bitrix("Ana")
+        garantir_resultados()
+        self.assertEqual(contadores_divergencia(1)["ponto"], 1)
+
+        with limite_consultas(0):
+            self.assertEqual(contadores_divergencia(1)["ponto"], 1)
+
+
+# ======================================================
+# PAGINAÇÃO POR CHAVE
+# ======================================================
+
+class PaginacaoKeysetTests(TestCase):
+    def setUp(self):
+        self.pks = [criar_bitrix(f"U{i}").pk for i in range(5)]
+        self.qs = BitrixUser.objects.all()
+
+    def pks_de(self, pagina):
+        return [u.pk for u in pagina]
+
+    def test_avanca_ate_a_ultima_pagina(self):
+        p1 = paginar_keyset(self.qs, 2)
+        self.assertEqual(self.pks_de(p1), self.pks[:2])
+        self.assertEqual((p1.tem_anterior, p1.tem_proxima), (False, True))
+        self.assertIsNone(p1.cursor_anterior)
+
+        p2 = paginar_keyset(self.qs, 2, apos=p1.cursor_proximo)
+        self.assertEqual(self.pks_de(p2), self.pks[2:4])
+
+        p3 = paginar_keyset(self.qs, 2, apos=p2.cursor_proximo)
+        self.assertEqual(self.pks_de(p3), self.pks[4:])
+        self.assertEqual((p3.tem_anterior, p3.tem_proxima), (True, False))
+        self.assertIsNone(p3.cursor_proximo)
+
+    def test_volta_pela_pagina_anterior(self):
+        p2 = paginar_keyset(self.qs, 2, apos=self.pks[1])
+
+        p1 = paginar_keyset(self.qs, 2, antes=p2.cursor_anterior)
+
+        self.assertEqual(self.pks_de(p1), self.pks[:2])
+        self.assertEqual((p1.tem_anterior, p1.tem_proxima), (False, True))
+
+    def test_cursor_invalido_e_a_primeira_pagina(self):
+        self.assertEqual(self.pks_de(paginar_keyset(self.qs, 2, apos="abc")), self.pks[:2])
+
+    def test_linha_removida_nao_desloca_a_pagina_seguinte(self):
+        p1 = paginar_keyset(self.qs, 2)
+        BitrixUser.objects.filter(pk=self.pks[0]).delete()
+
+        self.assertEqual(self.pks_de(paginar_keyset(self.qs, 2, apos=p1.cursor_proximo)), self.pks[2:4])
+
+
+# ======================================================
+# ORÇAMENTO DE SQL DAS VIEWS
+# ======================================================
+
+@override_settings(CACHES=CACHE_LOCAL, DASHBOARD_PAGE_SIZE=10)
+class OrcamentoSQLViewsTests(OrcamentoSQLTestMixin, TestCase):
+    """Base maior que a página: uma consulta por linha estouraria o orçamento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("adm", is_staff=True)
+        for i in range(40):
+            criar_bitrix(
+                f"U{i}", f"u{i}@x", status="Ativo" if i % 4 else "Inativo",
+                departamento_principal=f"D{i % 3}", user_dominio=f"d{i}", user_local=f"U{i}",
+            )
+            if i % 2:
+                PontoContact.objects.create(nome_completo=f"U{i}", status_ponto="A")
+                GesttaUser.objects.create(name=f"U{i}", email=f"u{i}@x")
+        SyncRun.objects.create(tipo="sync_all", status="success")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def test_dashboard_sem_resultados_materializados(self):
+        resp = self.assertDentroDoOrcamento(reverse("core:dashboard"))
+        self.assertEqual(len(resp.context["rows"]), 10)
+
+    def test_dashboard_com_filtros_e_cache(self):
+        garantir_resultados()
+        url = reverse("core:dashboard")
+        filtros = {"departamento": "D1", "q": "U", "div": "gestta"}
+        self.assertDentroDoOrcamento(url, data=filtros)
+        # segunda visita: agregados vêm do cache
+        with limite_consultas(8):
+            self.client.get(url, filtros)
+
+    def test_api_usuarios(self):
+        url = reverse("core:api_usuarios")
+        primeira = self.assertDentroDoOrcamento(url, data={"limite": 15}).json()
+        self.assertEqual(len(primeira["resultados"]), 15)
+
+        segunda = self.assertDentroDoOrcamento(url, data={"limite": 15, "apos": primeira["proximo"]}).json()
+        self.assertEqual(len(segunda["resultados"]), 15)
+
+    def test_exportar_usuarios(self):
+        # o corpo sai em streaming, depois do middleware: conta a leitura também
+        for formato in ("csv", "ndjson"):
+            cache.clear()
+            ReconciliationResult.objects.all().delete()
+            with self.subTest(formato=formato), limite_consultas(16):
+                resp = self.assertDentroDoOrcamento(
+                    reverse("core:exportar_usuarios"), data={"formato": formato, "status": "todos"},
+                )
+                linhas = b"".join(resp.streaming_content).decode().splitlines()
+            self.assertEqual(len(linhas), 40 + (formato == "csv"))
@@ -8,6 +8,12 @@ app_name = "core"
 
 urlpatterns = [
     path("", login_required(views.dashboard), name="dashboard"),
+    path("api/usuarios/", views.api_usuarios, name="api_usuarios"),
+    path("api/usuarios/exportar/", views.exportar_usuarios, name="exportar_usuarios"),
     path("sync/", is_staff_required(views.sync_manual), name="sync_manual"),
+    path("sync/historico/", is_staff_required(views.sync_historico), name="sync_historico"),
+    path("sync/progresso/", is_staff_required(views.sync_progresso), name="sync_progresso"),
+    path("jobs/<int:pk>/", views.job_status, name="job_status"),
+    path("metrics", views.metrics, name="metrics"),
 ]
  
\ No newline at end of file
@@ -1,173 +1,337 @@
 from django.shortcuts import render, redirect
 from django.conf import settings
-from django.http import HttpResponse
-from django.db.models import Q, Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .models import (
-    BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser, SyncRun, SyncDetail
+from .models import SyncRun, SyncDetail, SyncJob
+from .services.reconciliacao import garantir_resultados, reconstruir_resultados
+from .services.paginacao import paginar_keyset
+from .services.cache_dashboard import contadores_divergencia, lista_departamentos, total_filtrado, versao_dados
+from .services.consulta_usuarios import (
+    CAMPOS_EXPORTACAO, filtrar_usuarios, linha_exportacao, serializar_usuario, validacoes,
 )
-import subprocess
-import sys
-from django.contrib.auth.models import User
+from .services.jobs import enfileirar, status_job
+from .services.progresso import ler_progresso
+from .services import metricas
+from .services.perfil_sql import orcamento_sql
+import csv
+import hmac
+import json
+import os
+import time
+from datetime import timedelta
+from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models.functions import Lower
 
 def login_redirect(request):
     # apenas para garantir rota /login do urls global usa auth view
     return redirect("login")
 
-def _cmp_equal(a: str|None, b: str|None) -> bool:
-    """Comparação EXATA, sensível a caixa e acento. Apenas strip de borda."""
-    if a is None or b is None:
-        return False
-    return a.strip() == b.strip()
-
-def _bitrix_email(u: BitrixUser) -> str|None:
-    # se Bitrix não fornece email, permanece None
-    return (u.email or None)
-
-def _validacoes(u: BitrixUser):
-    #Retorna dict com status de cada fonte e motivo se falha.
-    result = {
-        "ponto": (False, "sem verificação"),
-        "gestta": (False, "sem verificação"),
-        "dominio": (False, "sem verificação"),
-        "web": (False, "sem verificação"),
-        "visao": (False, "sem verificação"),
-    }
-
-    email_b = _bitrix_email(u)
-
-    # Ponto: validação apenas pelo nome
-    if not u.nome_completo:
-        result["ponto"] = (False, "BITRIX sem nome para conciliar")
-    else:
-        qs = PontoContact.objects.filter(nome_completo=u.nome_completo)
-        count = qs.count()
-        if count == 1:
-            result["ponto"] = (True, "")
-        elif count == 0:
-            result["ponto"] = (False, "Ponto: nenhum registro com esse nome")
-        else:
-            result["ponto"] = (False, f"Ponto: duplicidade ({count} registros com mesmo nome)")
-
-    # GESTTA: apenas e-mail
-    if email_b is None:
-        result["gestta"] = (False, "BITRIX sem e-mail")
-    else:
-        result["gestta"] = (GesttaUser.objects.filter(email=email_b).exists(), "Gestta: e-mail não encontrado" if not GesttaUser.objects.filter(email=email_b).exists() else "")
-
-    # DOMÍNIO: user_dominio deve existir em DominioAccount.nome
-    if not u.user_dominio:
-        result["dominio"] = (False, "BITRIX sem User_Dominio")
-    else:
-        result["dominio"] = (DominioAccount.objects.filter(nome=u.user_dominio).exists(), "Domínio: user não encontrado" if not DominioAccount.objects.filter(nome=u.user_dominio).exists() else "")
-
-    # CCONTROLWEB: e-mail
-    if email_b is None:
-        result["web"] = (False, "BITRIX sem e-mail")
-    else:
-        result["web"] = (CcontrolWebUser.objects.filter(email=email_b).exists(), "Web: e-mail não encontrado" if not CcontrolWebUser.objects.filter(email=email_b).exists() else "")
-
-    # Visão Lógica: nome deve existir em VisaoLogicaUser.nome_funcionario
-    if not u.user_local:
-        result["visao"] = (False, "BITRIX sem nome para conciliar")
-    else:
-        exists = VisaoLogicaUser.objects.filter(nome_funcionario=u.user_local).exists()
-        result["visao"] = (exists, "Visão Lógica: nome não encontrado" if not exists else "")
+def _pagina_usuarios(request, users, tamanho):
+    """Página por chave (id), sem OFFSET, com a conciliação garantida só para ela."""
+    pagina = paginar_keyset(
+        users.select_related("reconciliacao"),
+        tamanho,
+        apos=request.GET.get("apos"),
+        antes=request.GET.get("antes"),
+    )
 
-    return result
+    # conciliação materializada (ReconciliationResult); calcula só quem
+    # da página visível ainda não tem
+    faltando = [u for u in pagina if not hasattr(u, "reconciliacao")]
+    if faltando:
+        reconstruir_resultados(faltando)
+    return pagina
 
 @login_required
+@orcamento_sql(18)  # 18 = base com resultados a calcular (índice das fontes + insert em lote)
 def dashboard(request):
-    # filtros
-    status = request.GET.get("status", "Ativo")  # padrão Ativo
-    dept = request.GET.get("departamento") or ""
-    q = request.GET.get("q") or ""
-    divergencias = request.GET.get("div")  # "ponto|gestta|dominio|web|visao" opcional
-
-    users = BitrixUser.objects.all()
-
-    if status in ("Ativo", "Inativo"):
-        users = users.filter(status=status)
-
-    if dept:
-        users = users.filter(departamento_principal=dept)
-
-    if q:
-        # busca "contém" mantendo sensibilidade — Django é case-sensitive em SQLite? Depende.
-        # Para MVP, usa icontains? NÃO. Precisamos sensível; então usamos contains puro.
-        users = users.filter(
-            Q(nome_user__contains=q) |
-            Q(nome_completo__contains=q) |
-            Q(user_dominio__contains=q) |
-            Q(user_local__contains=q) |
-            Q(email__contains=q)
-        )
+    # os contadores de divergência (em cache por sync) contam todos os
+    # ativos: resultado materializado de toda a base, não só da página
+    # (assim qualquer página, de qualquer filtro, também já vem pronta)
+    garantir_resultados()
 
-    # montar lista com validações (ineficiente para milhões, ok para MVP)
-    rows = []
-    total = users.count()
-    for u in users:
-        v = _validacoes(u)
-        if divergencias:
-            chave = divergencias.lower()
-            if chave in v and v[chave][0] is True:
-                # pediu ver só divergências dessa fonte, mas está ok => pula
-                continue
-        rows.append((u, v))
-
-    # dados para filtros de departamento
-    departamentos = (
-        BitrixUser.objects.exclude(departamento_principal__isnull=True)
-        .exclude(departamento_principal__exact="")
-        .values_list("departamento_principal", flat=True)
-        .distinct()
-        .order_by("departamento_principal")
-    )
+    users, filtros = filtrar_usuarios(request.GET)
+    versao = versao_dados()
+    total = total_filtrado(users, filtros, versao)
+
+    pagina = _pagina_usuarios(request, users, settings.DASHBOARD_PAGE_SIZE)
+    rows = [(u, validacoes(u)) for u in pagina]
 
-    # contadores de divergências por fonte
-    cont = {"ponto":0,"gestta":0,"dominio":0,"web":0,"visao":0}
-    for u in BitrixUser.objects.filter(status="Ativo"):
-        v = _validacoes(u)
-        for k in cont.keys():
-            if not v[k][0]:
-                cont[k]+=1
+    # links de navegação preservam os filtros
+    params = request.GET.copy()
+    params.pop("apos", None)
+    params.pop("antes", None)
+    filtros_qs = params.urlencode()
+
+    # agregados que só mudam a cada sync: cache por SyncRun
+    departamentos = lista_departamentos(versao)
+    cont = contadores_divergencia(versao)
 
     context = {
         "rows": rows,
         "total": total,
-        "status_sel": status,
-        "dept_sel": dept,
-        "q": q,
+        "pagina": pagina,
+        "filtros_qs": filtros_qs,
+        "status_sel": filtros["status"],
+        "dept_sel": filtros["departamento"],
+        "q": filtros["q"],
         "departamentos": departamentos,
-        "div_sel": divergencias or "",
-        "sync_last": SyncRun.objects.order_by("-created_at").first(),
+        "div_sel": filtros["div"],
+        "sync_last": SyncRun.objects.filter(tipo="sync_all").order_by("-created_at").first(),
         "cont_div": cont,
         "fontes": ["ponto", "gestta", "dominio", "web", "visao"],  # para exibição dinâmica
     }
 
     return render(request, "core/dashboard.html", context)
 
+# ======================================================
+# API (somente leitura) E EXPORTAÇÃO
+# ======================================================
+
+API_LIMITE_MAX = 500
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+
+@login_required
+@orcamento_sql(16)
+def api_usuarios(request):
+    """
+    Resultados da conciliação em JSON, com os mesmos filtros do dashboard
+    (status, departamento, q, div) e paginação por cursor: ?apos=<proximo>
+    ou ?antes=<anterior>; ?limite=N (máx. API_LIMITE_MAX).
+    """
+    try:
+        limite = min(max(int(request.GET.get("limite") or settings.DASHBOARD_PAGE_SIZE), 1), API_LIMITE_MAX)
+    except ValueError:
+        return JsonResponse({"erro": "limite inválido"}, status=400)
+
+    users, filtros = filtrar_usuarios(request.GET)
+    pagina = _pagina_usuarios(request, users, limite)
+
+    return JsonResponse({
+        "filtros": filtros,
+        "total": total_filtrado(users, filtros, versao_dados()),
+        "limite": limite,
+        "proximo": pagina.cursor_proximo,
+        "anterior": pagina.cursor_anterior,
+        "resultados": [serializar_usuario(u) for u in pagina],
+    })
+
+
+class _Eco:
+    """Buffer falso: csv.writer escreve e a linha volta direto para o stream."""
+
+    def write(self, valor):
+        return valor
+
+
+@login_required
+@orcamento_sql(16)
+def exportar_usuarios(request):
+    """
+    Relatório completo de divergências (mesmos filtros do dashboard) em
+    ?formato=csv (padrão) ou ndjson. Sai em streaming, lendo o banco em
+    blocos de EXPORT_CHUNK_SIZE: a memória não cresce com o nº de linhas.
+    """
+    formato = request.GET.get("formato", "csv")
+    if formato not in ("csv", "ndjson"):
+        return HttpResponse("formato deve ser csv ou ndjson\n", status=400, content_type="text/plain")
+
+    users, filtros = filtrar_usuarios(request.GET)
+    # quem ainda não tem resultado materializado é calculado antes de começar
+    garantir_resultados(users)
+    linhas = users.select_related("reconciliacao").order_by("pk").iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    if formato == "ndjson":
+        corpo = (json.dumps(serializar_usuario(u), ensure_ascii=False) + "\n" for u in linhas)
+        resp = StreamingHttpResponse(corpo, content_type="application/x-ndjson; charset=utf-8")
+    else:
+        writer = csv.DictWriter(_Eco(), fieldnames=CAMPOS_EXPORTACAO)
+
+        def corpo():
+            yield writer.writeheader()
+            for u in linhas:
+                yield writer.writerow(linha_exportacao(u))
+
+        resp = StreamingHttpResponse(corpo(), content_type="text/csv; charset=utf-8")
+
+    resp["Content-Disposition"] = f'attachment; filename="conciliacao.{formato}"'
+    return resp
+
+
 @user_passes_test(lambda u: u.is_staff)
 @staff_member_required
+@orcamento_sql(10)
 def sync_manual(request):
     if request.method == "POST":
-        try:
-            # roda no mesmo processo python
-            exitcode = subprocess.call([sys.executable, "manage.py", "sync_all"])
-            if exitcode == 0:
-                messages.success(request, "Atualização concluída com sucesso.")
-            else:
-                messages.error(request, f"Erro ao atualizar (exitcode={exitcode}).")
-        except Exception as e:
-            messages.error(request, f"Erro ao atualizar: {e}")
-        return redirect("sync_manual")
+        # só enfileira; o worker (manage.py sync_worker) executa em segundo plano
+        job, criado = enfileirar(SyncJob.TIPO_SYNC_ALL, request.user)
+        if criado:
+            messages.success(request, f"Atualização enfileirada (job #{job.id}).")
+        else:
+            messages.info(request, f"Já existe uma atualização em andamento (job #{job.id}).")
+        return redirect("core:sync_manual")
 
     itens = SyncDetail.objects.select_related("run").order_by("-created_at")[:50]
-    run = SyncRun.objects.order_by("-created_at").first()
-    return render(request, "core/sync_manual.html", {"itens": itens, "run": run})
+    run = SyncRun.objects.filter(tipo="sync_all").order_by("-created_at").first()
+    job = SyncJob.objects.filter(tipo=SyncJob.TIPO_SYNC_ALL).order_by("-created_at").first()
+    return render(request, "core/sync_manual.html", {"itens": itens, "run": run, "job": job})
+
+
+CAMPOS_HISTORICO = [
+    "run_id", "run_tipo", "run_status", "data", "fonte",
+    "lidos", "gravados", "ignorados", "inseridos", "atualizados", "removidos", "inalterados",
+    "duracao_fetch", "duracao_decode", "duracao_transform", "duracao_escrita", "duracao_total",
+    "bytes_baixados", "linhas_por_segundo", "mensagem_erro",
+]
+HISTORICO_DIAS_MAX = 3650
+
+
+@user_passes_test(lambda u: u.is_staff)
+@orcamento_sql(6)
+def sync_historico(request):
+    """
+    Série temporal dos SyncDetail (um registro por fonte/etapa por execução)
+    para comparar execuções: ?formato=csv|json, ?dias=90 (máx.
+    HISTORICO_DIAS_MAX), ?fonte=BITRIX.
+    """
+    try:
+        dias = min(max(int(request.GET.get("dias") or 90), 1), HISTORICO_DIAS_MAX)
+    except ValueError:
+        if request.GET.get("formato") == "json":
+            return JsonResponse({"erro": "dias inválido"}, status=400)
+        return HttpResponse("dias inválido\n", status=400, content_type="text/plain")
+    fonte = request.GET.get("fonte") or ""
+
+    detalhes = (
+        SyncDetail.objects.select_related("run")
+        .filter(created_at__gte=timezone.now() - timedelta(days=dias))
+        .order_by("created_at")
+    )
+    if fonte:
+        detalhes = detalhes.filter(fonte=fonte)
+
+    def linha(d):
+        return {
+            "run_id": d.run_id,
+            "run_tipo": d.run.tipo,
+            "run_status": d.run.status,
+            "data": d.created_at.isoformat(),
+            "fonte": d.fonte,
+            "lidos": d.lidos,
+            "gravados": d.gravados,
+            "ignorados": d.ignorados,
+            "inseridos": d.inseridos,
+            "atualizados": d.atualizados,
+            "removidos": d.removidos,
+            "inalterados": d.inalterados,
+            "duracao_fetch": d.duracao_fetch,
+            "duracao_decode": d.duracao_decode,
+            "duracao_transform": d.duracao_transform,
+            "duracao_escrita": d.duracao_escrita,
+            "duracao_total": d.duracao_total,
+            "bytes_baixados": d.bytes_baixados,
+            "linhas_por_segundo": d.linhas_por_segundo,
+            "mensagem_erro": d.mensagem_erro,
+        }
+
+    if request.GET.get("formato") == "json":
+        return JsonResponse({"series": [linha(d) for d in detalhes.iterator()]})
+
+    resp = HttpResponse(content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = 'attachment; filename="sync_historico.csv"'
+    writer = csv.DictWriter(resp, fieldnames=CAMPOS_HISTORICO)
+    writer.writeheader()
+    for d in detalhes.iterator():
+        writer.writerow(linha(d))
+    return resp
+
+
+ENDERECOS_LOCAIS = ("127.0.0.1", "::1")
+# cabeçalhos que um proxy reverso acrescenta: a requisição veio de fora
+CABECALHOS_PROXY = ("X-Forwarded-For", "X-Real-IP", "Forwarded")
+
+
+@orcamento_sql(25)
+def metrics(request):
+    """
+    Métricas no formato texto do Prometheus. Com METRICS_TOKEN exige
+    "Authorization: Bearer <token>" (nunca na URL: iria para os logs).
+
+    Sem token, só atende scrape local (o serve.py escuta em 0.0.0.0).
+    Limitação: atrás de um proxy reverso na mesma máquina todo REMOTE_ADDR
+    é 127.0.0.1; requisições com cabeçalho de proxy são recusadas, mas um
+    proxy que não os envia expõe /metrics. Nesse cenário, defina o token.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        enviado = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(enviado.encode(), token.encode()):
+            return HttpResponse("não autorizado\n", status=401, content_type="text/plain")
+    elif (
+        request.META.get("REMOTE_ADDR") not in ENDERECOS_LOCAIS
+        or any(c in request.headers for c in CABECALHOS_PROXY)
+    ):
+        return HttpResponse(
+            "defina METRICS_TOKEN para acesso remoto\n", status=403, content_type="text/plain",
+        )
+    return HttpResponse(metricas.exportar(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# cada conexão SSE ocupa uma thread do waitress: o stream é encerrado depois
+# desse tempo com "event: fim" e a tela segue por polling do instantâneo JSON
+SSE_MAX_SEGUNDOS = int(os.getenv("SSE_MAX_SEGUNDOS", 60))
+
+
+def _progresso_atual(run_id=None):
+    runs = SyncRun.objects.filter(tipo="sync_all")
+    run = runs.filter(pk=run_id).first() if run_id else runs.order_by("-id").first()
+    if run is None:
+        return None
+    return ler_progresso(run.id) or {"run": run.id, "status": run.status, "fontes": {}}
+
+
+@user_passes_test(lambda u: u.is_staff)
+def sync_progresso(request):
+    """
+    Progresso do sync em andamento (o mais recente, ou ?run=<id>).
+    Com ?formato=json devolve um instantâneo (long-poll simples);
+    sem isso, abre um stream Server-Sent Events.
+    """
+    run_id = request.GET.get("run") or None
+
+    if request.GET.get("formato") == "json":
+        return JsonResponse(_progresso_atual(run_id) or {})
+
+    def eventos():
+        yield "retry: 3000\n\n"
+        ultimo = None
+        limite = time.monotonic() + SSE_MAX_SEGUNDOS
+        while time.monotonic() < limite:
+            dados = _progresso_atual(run_id)
+            if dados != ultimo:
+                ultimo = dados
+                yield f"data: {json.dumps(dados)}\n\n"
+            if dados and dados.get("status") != "running":
+                yield 'event: fim\ndata: {"motivo": "concluido"}\n\n'
+                return
+            time.sleep(1)
+        yield 'event: fim\ndata: {"motivo": "tempo"}\n\n'
+
+    resp = StreamingHttpResponse(eventos(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@login_required
+@orcamento_sql(8)
+def job_status(request, pk):
+    """Estado do job (JSON) para acompanhamento pela tela."""
+    job = get_object_or_404(SyncJob, pk=pk)
+    return JsonResponse(status_job(job))
 
 
 # @user_passes_test(lambda u: u.is_staff)  # só staff/admin
@@ -1,7 +1,9 @@
+import os
 from waitress import serve
 from config.wsgi import application
 from django.conf import settings
 from whitenoise import WhiteNoise
+from core.services.jobs import iniciar_worker_em_thread
 
 if __name__ == "__main__":
     # Wrap da aplicação com WhiteNoise (serve arquivos estáticos)
@@ -9,4 +11,9 @@ if __name__ == "__main__":
     app.add_files(str(settings.STATIC_ROOT), prefix=settings.STATIC_URL)
     app.add_files(str(settings.MEDIA_ROOT), prefix=settings.MEDIA_URL)
 
+    # worker da fila de jobs no mesmo processo (desligue com SYNC_WORKER_EMBUTIDO=0
+    # se rodar "python manage.py sync_worker" separado)
+    if os.getenv("SYNC_WORKER_EMBUTIDO", "1") == "1":
+        iniciar_worker_em_thread()
+
     serve(app, host="0.0.0.0", port=5010)
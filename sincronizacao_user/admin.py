@@ -1,8 +1,10 @@
 from django.contrib import admin
 from .models import (
-    ColaboradorPonto, UsuarioBitrix, LogAtualizacaoCPF
+    ColaboradorPonto, UsuarioBitrix, LogAtualizacaoCPF, EstadoMatch, MarcaIncremental
 )
 
 admin.site.register(ColaboradorPonto)
 admin.site.register(UsuarioBitrix)
-admin.site.register(LogAtualizacaoCPF)
\ No newline at end of file
+admin.site.register(LogAtualizacaoCPF)
+admin.site.register(EstadoMatch)
+admin.site.register(MarcaIncremental)
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+def preencher_do_log(apps, schema_editor):
+    """Aproveita o histórico: último CPF registrado em LogAtualizacaoCPF por usuário."""
+    LogAtualizacaoCPF = apps.get_model("sincronizacao_user", "LogAtualizacaoCPF")
+    MatchCPFCheck = apps.get_model("sincronizacao_user", "MatchCPFCheck")
+
+    ultimo = {}
+    for id_bitrix, cpf, data in (
+        LogAtualizacaoCPF.objects.order_by("data_atualizacao")
+        .values_list("id_bitrix", "cpf", "data_atualizacao")
+        .iterator()
+    ):
+        ultimo[id_bitrix] = (cpf, data)
+
+    checks = list(MatchCPFCheck.objects.filter(id_bitrix__in=list(ultimo)))
+    for c in checks:
+        c.cpf_enviado, c.cpf_enviado_em = ultimo[c.id_bitrix]
+    MatchCPFCheck.objects.bulk_update(checks, ["cpf_enviado", "cpf_enviado_em"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacao_user', '0003_alter_matchcpfcheck_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchcpfcheck',
+            name='cpf_enviado',
+            field=models.CharField(blank=True, max_length=20, null=True, verbose_name='CPF enviado'),
+        ),
+        migrations.AddField(
+            model_name='matchcpfcheck',
+            name='cpf_enviado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Enviado em'),
+        ),
+        migrations.RunPython(preencher_do_log, migrations.RunPython.noop),
+    ]
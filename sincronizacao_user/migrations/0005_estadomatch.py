@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+def criar_estado(apps, schema_editor):
+    """Começa com os checks desatualizados: o próximo sync regera e grava as estatísticas."""
+    EstadoMatch = apps.get_model("sincronizacao_user", "EstadoMatch")
+    EstadoMatch.objects.get_or_create(pk=1, defaults={"geracao_bases": 1, "geracao_checks": 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacao_user', '0004_matchcpfcheck_cpf_enviado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geracao_bases', models.PositiveIntegerField(default=0)),
+                ('geracao_checks', models.PositiveIntegerField(default=0)),
+                ('stats', models.JSONField(blank=True, default=dict)),
+                ('bases_alteradas_em', models.DateTimeField(blank=True, null=True)),
+                ('checks_gerados_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estado do Match',
+                'verbose_name_plural': 'Estado do Match',
+            },
+        ),
+        migrations.RunPython(criar_estado, migrations.RunPython.noop),
+    ]
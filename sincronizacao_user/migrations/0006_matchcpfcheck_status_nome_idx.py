@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacao_user', '0005_estadomatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchcpfcheck',
+            index=models.Index(fields=['status', 'nome'], name='match_status_nome_idx'),
+        ),
+    ]
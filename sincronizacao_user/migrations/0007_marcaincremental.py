@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacao_user', '0006_matchcpfcheck_status_nome_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaIncremental',
+            fields=[
+                ('tabela', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('coluna', models.CharField(max_length=64)),
+                ('valor', models.CharField(blank=True, default='', max_length=64)),
+                ('ultima_completa_em', models.DateTimeField(blank=True, null=True, verbose_name='Última carga completa')),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marca Incremental (MySQL)',
+                'verbose_name_plural': 'Marcas Incrementais (MySQL)',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacao_user', '0007_marcaincremental'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='colaboradorponto',
+            name='nome_completo',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='Nome Completo'),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 
 class ColaboradorPonto(models.Model):
     cpf = models.CharField(max_length=20, primary_key=True, verbose_name="CPF")
-    nome_completo = models.CharField(max_length=255, verbose_name="Nome Completo")
+    nome_completo = models.CharField(max_length=255, db_index=True, verbose_name="Nome Completo")
 
     class Meta:
         verbose_name = "Colaborador Ponto (Cache)"
@@ -55,13 +55,76 @@ class MatchCPFCheck(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     obs = models.TextField(blank=True)
 
+    # último CPF aceito pelo Bitrix para este usuário (evita reenvio sem mudança)
+    cpf_enviado = models.CharField(max_length=20, null=True, blank=True, verbose_name="CPF enviado")
+    cpf_enviado_em = models.DateTimeField(null=True, blank=True, verbose_name="Enviado em")
+
     atualizado_em = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Check Match (Ponto x Bitrix)"
         verbose_name_plural = "Checks Match (Ponto x Bitrix)"
         ordering = ["status", "nome"]
+        indexes = [
+            # filtro por status + ordenação por nome da tela de checagem
+            models.Index(fields=["status", "nome"], name="match_status_nome_idx"),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.id_bitrix}) - {self.status}"
 
+
+
+class EstadoMatch(models.Model):
+    """
+    Linha única (pk=1) com o carimbo de geração das bases locais.
+
+    sync_bases incrementa `geracao_bases` quando os loaders mudam alguma
+    linha de ColaboradorPonto/UsuarioBitrix. MatchCPFCheck só é regerado
+    quando `geracao_checks` ficou para trás; as estatísticas da última
+    geração ficam em `stats` para a tela ler sem recalcular.
+    """
+
+    geracao_bases = models.PositiveIntegerField(default=0)
+    geracao_checks = models.PositiveIntegerField(default=0)
+    stats = models.JSONField(default=dict, blank=True)
+    bases_alteradas_em = models.DateTimeField(null=True, blank=True)
+    checks_gerados_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Estado do Match"
+        verbose_name_plural = "Estado do Match"
+
+    @classmethod
+    def atual(cls):
+        # sem linha ainda: nasce desatualizado para o próximo sync regerar
+        estado, _ = cls.objects.get_or_create(pk=1, defaults={"geracao_bases": 1})
+        return estado
+
+    @property
+    def checks_desatualizados(self):
+        return self.geracao_checks != self.geracao_bases
+
+    def __str__(self):
+        return f"Bases g{self.geracao_bases} / checks g{self.geracao_checks}"
+
+
+class MarcaIncremental(models.Model):
+    """
+    Marca d'água da carga incremental de uma tabela do MySQL: maior valor
+    já lido de `coluna` (ID crescente ou data de alteração). A próxima
+    carga só busca linhas com coluna >= valor.
+    """
+
+    tabela = models.CharField(max_length=100, primary_key=True)
+    coluna = models.CharField(max_length=64)
+    valor = models.CharField(max_length=64, blank=True, default="")
+    ultima_completa_em = models.DateTimeField(null=True, blank=True, verbose_name="Última carga completa")
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Marca Incremental (MySQL)"
+        verbose_name_plural = "Marcas Incrementais (MySQL)"
+
+    def __str__(self):
+        return f"{self.tabela}.{self.coluna} >= {self.valor or '—'}"
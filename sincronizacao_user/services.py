@@ -1,8 +1,25 @@
 import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 import pyodbc
 import requests
 from django.db import transaction
-from .models import ColaboradorPonto, UsuarioBitrix, LogAtualizacaoCPF, MatchCPFCheck
+from django.db.models import F
+from django.utils import timezone
+from core.services.bulk import bulk_upsert
+from core.services.cronometro import Cronometro, registrar_etapa
+from core.services.http import get_session
+from .models import (
+    ColaboradorPonto, UsuarioBitrix, LogAtualizacaoCPF, MatchCPFCheck, EstadoMatch, MarcaIncremental,
+)
 
 
 # ======================================================
@@ -32,156 +49,508 @@ def get_mysql_connection():
     return pyodbc.connect(connection_string)
 
 
-# ======================================================
-# 1. SINCRONIZAR PONTO (MySQL -> Django Model)
-# ======================================================
+# Conexões reaproveitadas entre execuções (o worker roda vários
+# sync_bases no mesmo processo) e leitura em blocos de fetchmany.
+ODBC_POOL_TAMANHO = int(os.getenv("ODBC_POOL_TAMANHO", 2))
+ODBC_POOL_OCIOSO_MAX = float(os.getenv("ODBC_POOL_OCIOSO_MAX", 300))  # s; o MySQL derruba ociosas (wait_timeout)
+ODBC_FETCH_TAMANHO = int(os.getenv("ODBC_FETCH_TAMANHO", 1000))
 
-def sync_colaboradores_ponto():
-    """Busca dados no MySQL e atualiza a tabela local ColaboradorPonto."""
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
 
-    try:
-        cursor.execute("""
-            SELECT 
-                CONCAT_WS(' ', firstname, lastname) AS nome_completo,
-                cpf
-            FROM 
-                ccontroll_db_api.coalize_colaboradores
-            WHERE
-                status <> 99
-        """)
+class PoolODBC:
+    """
+    Pool pequeno de conexões ODBC. A conexão volta para o pool ao fim do
+    bloco `with`; se o bloco falhar, ou se ela ficou ociosa mais que
+    `ocioso_max` segundos, é fechada e a próxima chamada abre outra.
+    """
 
-        colaboradores = cursor.fetchall()
+    def __init__(self, fabrica, tamanho, ocioso_max):
+        self._fabrica = fabrica
+        self._tamanho = tamanho
+        self._ocioso_max = ocioso_max
+        self._livres = []  # pilha de (conexão, devolvida_em)
+        self._lock = threading.Lock()
 
-        count = 0
-        for row in colaboradores:
-            nome_completo = row[0]
-            cpf = row[1]
+    @contextmanager
+    def conexao(self):
+        conn = self._pegar()
+        try:
+            yield conn
+        except Exception:
+            self._descartar(conn)
+            raise
+        self._devolver(conn)
+
+    def _pegar(self):
+        agora = time.monotonic()
+        with self._lock:
+            while self._livres:
+                conn, devolvida_em = self._livres.pop()
+                if agora - devolvida_em <= self._ocioso_max:
+                    return conn
+                self._descartar(conn)
+        return self._fabrica()
+
+    def _devolver(self, conn):
+        try:
+            # encerra a transação do SELECT: no REPEATABLE READ do MySQL a
+            # próxima leitura veria o snapshot antigo
+            conn.rollback()
+        except pyodbc.Error:
+            self._descartar(conn)
+            return
+        with self._lock:
+            if len(self._livres) < self._tamanho:
+                self._livres.append((conn, time.monotonic()))
+                return
+        self._descartar(conn)
+
+    @staticmethod
+    def _descartar(conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def fechar(self):
+        with self._lock:
+            livres, self._livres = self._livres, []
+        for conn, _ in livres:
+            self._descartar(conn)
 
-            if not cpf:
-                continue
 
-            ColaboradorPonto.objects.update_or_create(
-                cpf=cpf,
-                defaults={'nome_completo': nome_completo}
-            )
-            count += 1
+pool_mysql = PoolODBC(get_mysql_connection, ODBC_POOL_TAMANHO, ODBC_POOL_OCIOSO_MAX)
 
-        return f"{count} colaboradores do Ponto sincronizados."
 
+def ler_em_blocos(cursor, tamanho, profundidade=2):
+    """
+    Gera os blocos de cursor.fetchmany(tamanho). A leitura roda numa thread
+    auxiliar até `profundidade` blocos à frente, então a gravação de um
+    bloco no SQLite acontece enquanto o próximo chega do MySQL; em memória
+    ficam no máximo profundidade + 1 blocos.
+    """
+    fila = queue.Queue(maxsize=profundidade)
+    parar = threading.Event()
+    fim = object()
+
+    def entregar(item):
+        while not parar.is_set():
+            try:
+                fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def ler():
+        try:
+            while True:
+                bloco = cursor.fetchmany(tamanho)
+                if not bloco:
+                    entregar(fim)
+                    return
+                if not entregar(bloco):
+                    return
+        except Exception as e:
+            entregar(e)
+
+    leitor = threading.Thread(target=ler, name="odbc-fetch", daemon=True)
+    leitor.start()
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
     finally:
-        cursor.close()
-        conn.close()
+        parar.set()
+        leitor.join()
 
 
 # ======================================================
-# 2. SINCRONIZAR BITRIX (MySQL -> Django Model)
+# GERAÇÃO DAS BASES LOCAIS
 # ======================================================
 
-def sync_usuarios_bitrix():
-    """Busca dados no MySQL e atualiza a tabela local UsuarioBitrix."""
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
+def contar_alterados(model, campo, objs):
+    """Quantos objs inserem ou mudam `campo` em relação ao que já está gravado."""
+    existentes = dict(
+        model.objects.filter(pk__in=[o.pk for o in objs]).values_list("pk", campo)
+    )
+    return sum(1 for o in objs if existentes.get(o.pk) != getattr(o, campo))
 
-    try:
-        ids_ignorados = (
-            11, 1, 10525, 9649, 16, 16019, 1476, 13861, 20377,
-            3279, 21583, 5983, 6, 1388, 4841, 6093, 8951, 922, 9
-        )
-        ids_str = ",".join(map(str, ids_ignorados))
 
-        query = f"""
+def marcar_bases_alteradas():
+    """Avança a geração das bases: o próximo garantir_checks_atualizados regera."""
+    EstadoMatch.atual()
+    EstadoMatch.objects.filter(pk=1).update(
+        geracao_bases=F("geracao_bases") + 1, bases_alteradas_em=timezone.now()
+    )
+
+
+# Carga incremental: cada tabela guarda a marca d'água (MarcaIncremental)
+# e só busca linhas com coluna >= marca. Com ID crescente isso pega as
+# linhas novas; com coluna de data de alteração, também as alteradas e as
+# inativadas. O que a marca não enxerga (ex.: inativação de linha antiga
+# quando a marca é o ID) é corrigido pela carga completa periódica.
+# Coluna vazia ("") desliga o incremental da tabela: sempre carga completa.
+MYSQL_INCREMENTAL = os.getenv("MYSQL_INCREMENTAL", "1") == "1"
+MYSQL_COMPLETA_HORAS = float(os.getenv("MYSQL_COMPLETA_HORAS", 24))
+# Ponto: opt-in. A consulta original não lê nenhuma coluna crescente de
+# coalize_colaboradores; defina só com uma coluna que exista e nunca
+# diminua (ex.: data de alteração), senão linhas somem até a próxima completa
+MYSQL_MARCA_PONTO = os.getenv("MYSQL_MARCA_PONTO", "")
+# Bitrix: ID de core_usuarios_bitrix (já lido pela consulta original)
+MYSQL_MARCA_BITRIX = os.getenv("MYSQL_MARCA_BITRIX", "ID")
+
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _coluna_marca(coluna):
+    if coluna and not _IDENTIFICADOR.match(coluna):
+        raise ValueError(f"Coluna de marca inválida: {coluna!r}")
+    return coluna
+
+
+def decidir_carga(tabela, coluna, completa=None):
+    """
+    (marca, completa): marca a usar na consulta (None = carga completa).
+    A carga é completa se pedida, sem marca gravada, se a coluna mudou ou
+    se a última completa passou de MYSQL_COMPLETA_HORAS.
+    """
+    if completa or not (MYSQL_INCREMENTAL and coluna):
+        return None, True
+    marca = MarcaIncremental.objects.filter(pk=tabela).first()
+    if marca is None or marca.coluna != coluna or not marca.valor or marca.ultima_completa_em is None:
+        return None, True
+    if timezone.now() - marca.ultima_completa_em > timedelta(hours=MYSQL_COMPLETA_HORAS):
+        return None, True
+    return marca.valor, False
+
+
+def gravar_marca(tabela, coluna, valor, completa):
+    if not coluna:
+        return
+    campos = {"coluna": coluna}
+    if valor is not None:
+        campos["valor"] = str(valor)
+    if completa:
+        campos["ultima_completa_em"] = timezone.now()
+    MarcaIncremental.objects.update_or_create(pk=tabela, defaults=campos)
+
+
+def _remover(model, chaves, tamanho=500):
+    chaves = list(chaves)
+    removidos = 0
+    for i in range(0, len(chaves), tamanho):
+        removidos += model.objects.filter(pk__in=chaves[i:i + tamanho]).delete()[0]
+    return removidos
+
+
+def carregar_do_mysql(query, params, model, campo, montar, rotulo, crono, completa):
+    """
+    Executa `query` no MySQL e grava o resultado em `model` bloco a bloco
+    (fetchmany -> instâncias -> bulk_upsert), sem materializar a tabela
+    inteira. No cronômetro, "fetch" é só a espera por blocos que ainda
+    não chegaram.
+
+    `montar(row)` devolve (chave, instância): chave None ignora a linha;
+    instância None marca a chave como inativa (removida no fim). A última
+    coluna de cada linha é a marca d'água.
+
+    Carga completa: remove localmente tudo que não veio na consulta.
+    Retorna os contadores para o SyncDetail e a maior marca lida.
+    """
+    cont = {"lidos": 0, "ignorados": 0, "inseridos": 0, "atualizados": 0, "inalterados": 0, "removidos": 0}
+    ativos, inativos = set(), set()
+    marca = None
+    alterou = False
+
+    with pool_mysql.conexao() as conn:
+        cursor = conn.cursor()
+        blocos = None
+        try:
+            with crono.etapa("fetch"):
+                cursor.execute(query, *params)
+            blocos = ler_em_blocos(cursor, ODBC_FETCH_TAMANHO)
+            while True:
+                with crono.etapa("fetch"):
+                    bloco = next(blocos, None)
+                if bloco is None:
+                    break
+
+                with crono.etapa("transform"):
+                    objs = []
+                    for row in bloco:
+                        if row[-1] is not None and (marca is None or row[-1] > marca):
+                            marca = row[-1]
+                        chave, obj = montar(row)
+                        if chave is None:
+                            cont["ignorados"] += 1
+                        elif obj is None:
+                            inativos.add(chave)
+                        else:
+                            ativos.add(chave)
+                            objs.append(obj)
+                    alterados = contar_alterados(model, campo, objs)
+                with crono.etapa("escrita"):
+                    criados, atualizados = bulk_upsert(
+                        model, objs, unique_field=model._meta.pk.name,
+                        update_fields=[campo], rotulo=rotulo,
+                    )
+
+                cont["lidos"] += len(bloco)
+                cont["inseridos"] += criados
+                cont["atualizados"] += atualizados
+                cont["inalterados"] += len(objs) - alterados
+                alterou = alterou or alterados > 0
+
+            with crono.etapa("escrita"):
+                if completa:
+                    # o que existe aqui e não veio na consulta saiu (ou inativou) lá
+                    remover = set(model.objects.values_list("pk", flat=True)) - ativos
+                else:
+                    # chave reativada em outra linha da mesma carga prevalece
+                    remover = inativos - ativos
+                cont["removidos"] = _remover(model, remover)
+                alterou = alterou or cont["removidos"] > 0
+        finally:
+            if blocos is not None:
+                blocos.close()
+            cursor.close()
+            # blocos já gravados contam mesmo se a leitura falhar no meio
+            if alterou:
+                marcar_bases_alteradas()
+
+    cont["gravados"] = cont["inseridos"] + cont["atualizados"]
+    return cont, marca
+
+
+def _descricao_carga(completa):
+    return "carga completa" if completa else "incremental"
+
+
+# ======================================================
+# 1. SINCRONIZAR PONTO (MySQL -> Django Model)
+# ======================================================
+
+def sync_colaboradores_ponto(run=None, completa=None):
+    """
+    Busca dados no MySQL e atualiza a tabela local ColaboradorPonto.
+    Completa por padrão (com remoção dos desligados, status 99); incremental
+    só com MYSQL_MARCA_PONTO definido. Ver decidir_carga.
+    Com `run` (SyncRun), registra tempos e contadores em SyncDetail (MYSQL_PONTO).
+    """
+    crono = Cronometro()
+    tabela = "ccontroll_db_api.coalize_colaboradores"
+    coluna = _coluna_marca(MYSQL_MARCA_PONTO)
+    marca, completa = decidir_carga(tabela, coluna, completa)
+
+    if marca is None:
+        filtro, params = "status <> 99", []
+    else:
+        # inclui os desligados alterados desde a marca, para removê-los
+        filtro, params = f"{coluna} >= ?", [marca]
+
+    query = f"""
             SELECT 
-                ID,
-                NAME
+                CONCAT_WS(' ', firstname, lastname) AS nome_completo,
+                cpf,
+                status,
+                {coluna or "NULL"} AS marca
             FROM 
-                ccontroll_db_api.core_usuarios_bitrix
+                {tabela}
             WHERE
-                ID NOT IN ({ids_str})
-            AND
-                STATUS <> 0
+                {filtro}
         """
 
-        cursor.execute(query)
-        usuarios = cursor.fetchall()
+    def montar(row):
+        if not row[1]:
+            return None, None
+        if str(row[2]) == "99":
+            return row[1], None
+        return row[1], ColaboradorPonto(cpf=row[1], nome_completo=row[0])
 
-        count = 0
-        for row in usuarios:
-            id_bitrix = row[0]
-            nome = row[1]
+    cont, nova_marca = carregar_do_mysql(
+        query, params, ColaboradorPonto, "nome_completo", montar, "PONTO (MySQL)", crono, completa,
+    )
+    gravar_marca(tabela, coluna, nova_marca, completa)
+    registrar_etapa(run, "MYSQL_PONTO", crono, **cont)
 
-            UsuarioBitrix.objects.update_or_create(
-                id_bitrix=id_bitrix,
-                defaults={'nome': nome}
-            )
-            count += 1
+    return (
+        f"{cont['gravados']} colaboradores do Ponto sincronizados ({_descricao_carga(completa)}: "
+        f"{cont['inseridos']} novos, {cont['atualizados']} atualizados, {cont['removidos']} removidos)."
+    )
 
-        return f"{count} usuários do Bitrix sincronizados."
 
-    finally:
-        cursor.close()
-        conn.close()
+# ======================================================
+# 2. SINCRONIZAR BITRIX (MySQL -> Django Model)
+# ======================================================
 
+def sync_usuarios_bitrix(run=None, completa=None):
+    """
+    Busca dados no MySQL e atualiza a tabela local UsuarioBitrix.
+    Incremental pela marca MYSQL_MARCA_BITRIX; completa (com remoção dos
+    inativos, STATUS 0) quando pedida ou vencida. Ver decidir_carga.
+    Com `run` (SyncRun), registra tempos e contadores em SyncDetail (MYSQL_BITRIX).
+    """
+    crono = Cronometro()
+    tabela = "ccontroll_db_api.core_usuarios_bitrix"
+    coluna = _coluna_marca(MYSQL_MARCA_BITRIX)
+    marca, completa = decidir_carga(tabela, coluna, completa)
+
+    ids_ignorados = (
+        11, 1, 10525, 9649, 16, 16019, 1476, 13861, 20377,
+        3279, 21583, 5983, 6, 1388, 4841, 6093, 8951, 922, 9
+    )
+    ids_str = ",".join(map(str, ids_ignorados))
+
+    if marca is None:
+        filtro, params = "STATUS <> 0", []
+    else:
+        # inclui os inativados alterados desde a marca, para removê-los
+        filtro, params = f"{coluna} >= ?", [marca]
+
+    query = f"""
+        SELECT 
+            ID,
+            NAME,
+            STATUS,
+            {coluna or "NULL"} AS marca
+        FROM 
+            {tabela}
+        WHERE
+            ID NOT IN ({ids_str})
+        AND
+            {filtro}
+    """
 
+    def montar(row):
+        if str(row[2]) == "0":
+            return row[0], None
+        return row[0], UsuarioBitrix(id_bitrix=row[0], nome=row[1])
 
+    cont, nova_marca = carregar_do_mysql(
+        query, params, UsuarioBitrix, "nome", montar, "BITRIX (MySQL)", crono, completa,
+    )
+    gravar_marca(tabela, coluna, nova_marca, completa)
+    registrar_etapa(run, "MYSQL_BITRIX", crono, **cont)
 
-@transaction.atomic
-def gerar_checks_match_persistidos():
-    """
-    Gera e salva (persistido) os checks do match EXATO por nome.
-    A tabela MatchCPFCheck vira a fonte para exibição e envio.
-    """
+    return (
+        f"{cont['gravados']} usuários do Bitrix sincronizados ({_descricao_carga(completa)}: "
+        f"{cont['inseridos']} novos, {cont['atualizados']} atualizados, {cont['removidos']} removidos)."
+    )
 
-    # Mapa: nome_completo -> lista de cpfs (para detectar duplicados)
-    ponto_map = {}
-    for c in ColaboradorPonto.objects.exclude(cpf__isnull=True).exclude(cpf="").only("nome_completo", "cpf"):
-        ponto_map.setdefault(c.nome_completo, []).append(c.cpf)
 
-    ok = sem_match = duplicado = 0
 
-    # Vamos montar lista para bulk_create/update
-    checks_to_upsert = []
 
-    for u in UsuarioBitrix.objects.all().only("id_bitrix", "nome"):
-        cpfs = ponto_map.get(u.nome)
+# ======================================================
+# MOTOR DE MATCH (nome Bitrix -> CPF Ponto)
+# ======================================================
 
-        if not cpfs:
-            status = MatchCPFCheck.STATUS_SEM_MATCH
-            cpf = None
-            obs = "Nome não encontrado no Ponto"
-            sem_match += 1
+@dataclass(frozen=True)
+class ResultadoMatch:
+    """Resultado do match EXATO por nome de um usuário do Bitrix."""
+
+    id_bitrix: int
+    nome: str
+    status: str  # MatchCPFCheck.STATUS_*
+    cpf: str | None
+    obs: str
+
+    @property
+    def ok(self):
+        return self.status == MatchCPFCheck.STATUS_OK
+
+
+def indice_ponto():
+    """nome_completo -> [cpfs] do Ponto, numa única leitura (duplicados ficam visíveis)."""
+    indice = {}
+    for nome, cpf in ColaboradorPonto.objects.exclude(cpf="").values_list("nome_completo", "cpf").iterator():
+        indice.setdefault(nome, []).append(cpf)
+    return indice
+
+
+def casar(id_bitrix, nome, indice):
+    """ResultadoMatch de um usuário contra o índice do Ponto."""
+    cpfs = indice.get(nome)
+    if not cpfs:
+        return ResultadoMatch(id_bitrix, nome, MatchCPFCheck.STATUS_SEM_MATCH, None, "Nome não encontrado no Ponto")
+    if len(cpfs) > 1:
+        return ResultadoMatch(
+            id_bitrix, nome, MatchCPFCheck.STATUS_DUPLICADO, None, f"{len(cpfs)} CPFs no Ponto para o mesmo nome",
+        )
+    return ResultadoMatch(id_bitrix, nome, MatchCPFCheck.STATUS_OK, cpfs[0], "Pronto para atualizar no Bitrix")
 
-        elif len(cpfs) > 1:
-            status = MatchCPFCheck.STATUS_DUPLICADO
-            cpf = None
-            obs = f"{len(cpfs)} CPFs no Ponto para o mesmo nome"
-            duplicado += 1
 
-        else:
-            status = MatchCPFCheck.STATUS_OK
-            cpf = cpfs[0]
-            obs = "Pronto para atualizar no Bitrix"
-            ok += 1
-
-        checks_to_upsert.append(MatchCPFCheck(
-            id_bitrix=u.id_bitrix,
-            nome=u.nome,
-            cpf=cpf,
-            status=status,
-            obs=obs
-        ))
+def resultados_match(usuarios=None, indice=None):
+    """
+    Gera um ResultadoMatch por usuário do Bitrix. `usuarios`: pares
+    (id_bitrix, nome); padrão é toda a UsuarioBitrix. Custa uma leitura
+    de cada tabela, independente do número de usuários.
+    """
+    if indice is None:
+        indice = indice_ponto()
+    if usuarios is None:
+        usuarios = UsuarioBitrix.objects.values_list("id_bitrix", "nome").iterator()
+    for id_bitrix, nome in usuarios:
+        yield casar(id_bitrix, nome, indice)
+
+
+def contar_status(resultados):
+    """{status: quantidade} de uma lista de ResultadoMatch."""
+    return Counter(r.status for r in resultados)
+
+
+@transaction.atomic
+def gerar_checks_match_persistidos(run=None):
+    """
+    Gera e salva (persistido) os checks do match EXATO por nome.
+    A tabela MatchCPFCheck vira a fonte para exibição e envio.
+    Com `run` (SyncRun), registra tempos em SyncDetail (MATCH_CPF).
+    Grava as estatísticas e a geração usada em EstadoMatch.
+    """
+    crono = Cronometro()
+    # lida antes das bases: se um sync_bases mudar algo durante a geração,
+    # a próxima chamada ainda vê os checks como desatualizados
+    geracao = EstadoMatch.atual().geracao_bases
+
+    with crono.etapa("fetch"):
+        indice = indice_ponto()
+        usuarios = list(UsuarioBitrix.objects.values_list("id_bitrix", "nome"))
+
+    with crono.etapa("transform"):
+        resultados = list(resultados_match(usuarios, indice))
+        por_status = contar_status(resultados)
+        ok = por_status[MatchCPFCheck.STATUS_OK]
+        sem_match = por_status[MatchCPFCheck.STATUS_SEM_MATCH]
+        duplicado = por_status[MatchCPFCheck.STATUS_DUPLICADO]
+
+        # Vamos montar lista para bulk_create/update
+        checks_to_upsert = [
+            MatchCPFCheck(id_bitrix=r.id_bitrix, nome=r.nome, cpf=r.cpf, status=r.status, obs=r.obs)
+            for r in resultados
+        ]
 
     # ✅ UPSERT PROFISSIONAL
     # Requer Django 4.1+ (bulk_create com update_conflicts)
-    MatchCPFCheck.objects.bulk_create(
-        checks_to_upsert,
-        update_conflicts=True,
-        unique_fields=["id_bitrix"],
-        update_fields=["nome", "cpf", "status", "obs", "atualizado_em"]
+    with crono.etapa("escrita"):
+        MatchCPFCheck.objects.bulk_create(
+            checks_to_upsert,
+            update_conflicts=True,
+            unique_fields=["id_bitrix"],
+            update_fields=["nome", "cpf", "status", "obs", "atualizado_em"]
+        )
+        # checks de usuários que saíram do Bitrix (removidos pela carga completa)
+        removidos = MatchCPFCheck.objects.exclude(
+            id_bitrix__in=UsuarioBitrix.objects.values("id_bitrix")
+        ).delete()[0]
+
+    registrar_etapa(
+        run, "MATCH_CPF", crono, lidos=len(usuarios), gravados=len(checks_to_upsert), removidos=removidos,
     )
 
-    return {
+    stats = {
         "total_bitrix": UsuarioBitrix.objects.count(),
         "total_ponto": ColaboradorPonto.objects.count(),
         "ok": ok,
@@ -189,6 +558,21 @@ def gerar_checks_match_persistidos():
         "duplicado": duplicado,
         "problemas": sem_match + duplicado,
     }
+    EstadoMatch.objects.filter(pk=1).update(
+        geracao_checks=geracao, stats=stats, checks_gerados_em=timezone.now()
+    )
+    return stats
+
+
+def garantir_checks_atualizados(run=None):
+    """
+    Regera MatchCPFCheck só se as bases mudaram desde a última geração
+    (carimbo em EstadoMatch). Retorna (stats, regerou).
+    """
+    estado = EstadoMatch.atual()
+    if not estado.checks_desatualizados:
+        return estado.stats, False
+    return gerar_checks_match_persistidos(run=run), True
 
 
 
@@ -196,13 +580,21 @@ def gerar_checks_match_persistidos():
 # 3. WEBHOOK BITRIX
 # ======================================================
 
-def enviar_cpf_bitrix(id_usuario, cpf):
-    """Envia o CPF para o Bitrix via Webhook."""
+ENVIO_OK = "OK"
+ENVIO_LIMITE = "QUERY_LIMIT_EXCEEDED"
+ENVIO_ERRO = "ERRO"
+
+
+def _enviar_cpf_bitrix(id_usuario, cpf):
+    """
+    Envia o CPF para o Bitrix via Webhook.
+    Retorna ENVIO_OK, ENVIO_LIMITE (Bitrix pediu para desacelerar) ou ENVIO_ERRO.
+    """
     webhook_url = os.getenv("WEBHOOK_URL", "")
 
     if not webhook_url:
         print("AVISO: WEBHOOK_URL não configurado.")
-        return False
+        return ENVIO_ERRO
 
     url = f"{webhook_url}user.update.json"
 
@@ -212,12 +604,222 @@ def enviar_cpf_bitrix(id_usuario, cpf):
     }
 
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = get_session().post(url, json=payload, timeout=10)
+        if response.status_code in (429, 503) and ENVIO_LIMITE in response.text:
+            return ENVIO_LIMITE
         response.raise_for_status()
-        return True
+        return ENVIO_OK
     except requests.RequestException as e:
         print(f"Erro ao enviar webhook para ID {id_usuario}: {e}")
-        return False
+        return ENVIO_ERRO
+
+
+def enviar_cpf_bitrix(id_usuario, cpf):
+    """Envia o CPF para o Bitrix via Webhook."""
+    return _enviar_cpf_bitrix(id_usuario, cpf) == ENVIO_OK
+
+
+# Bitrix aceita até 50 comandos por chamada de batch
+BITRIX_BATCH_TAMANHO = min(int(os.getenv("BITRIX_BATCH_TAMANHO", 50)), 50)
+
+
+def _enviar_lote_bitrix(itens):
+    """
+    Envia vários CPFs numa única chamada batch.json (halt=0).
+    `itens`: lista de (id_bitrix, cpf).
+    Retorna (status, oks), onde `oks` tem um bool por item, na mesma ordem.
+    Se a chamada inteira falhar, status é ENVIO_LIMITE/ENVIO_ERRO e oks é tudo False.
+    """
+    webhook_url = os.getenv("WEBHOOK_URL", "")
+    falhou = [False] * len(itens)
+
+    if not webhook_url:
+        print("AVISO: WEBHOOK_URL não configurado.")
+        return ENVIO_ERRO, falhou
+
+    url = f"{webhook_url}batch.json"
+
+    # chave por posição: o mesmo ID pode aparecer duas vezes no lote
+    cmd = {
+        f"c{i}": "user.update?" + urlencode({"ID": int(id_usuario), "UF_USR_1766407282224": str(cpf)})
+        for i, (id_usuario, cpf) in enumerate(itens)
+    }
+
+    try:
+        response = get_session().post(url, json={"halt": 0, "cmd": cmd}, timeout=30)
+        if response.status_code in (429, 503) and ENVIO_LIMITE in response.text:
+            return ENVIO_LIMITE, falhou
+        response.raise_for_status()
+        corpo = response.json().get("result") or {}
+    except (requests.RequestException, ValueError) as e:
+        print(f"Erro ao enviar lote de {len(itens)} CPFs ao Bitrix: {e}")
+        return ENVIO_ERRO, falhou
+
+    # result: {chave: retorno} dos comandos que deram certo
+    # result_error: {chave: erro} dos que falharam
+    resultados = corpo.get("result") or {}
+    erros = corpo.get("result_error") or {}
+    if isinstance(resultados, list):
+        resultados = {f"c{i}": r for i, r in enumerate(resultados)}
+    if isinstance(erros, list):
+        erros = {f"c{i}": r for i, r in enumerate(erros)}
+
+    oks = [
+        chave not in erros and bool(resultados.get(chave))
+        for chave in cmd
+    ]
+    return ENVIO_OK, oks
+
+
+# ======================================================
+# 3B. DESPACHO CONCORRENTE (RATE LIMIT DO BITRIX)
+# ======================================================
+
+# Limites REST do Bitrix24: ~2 req/s sustentado, rajada de até 50
+BITRIX_RATE_LIMIT = float(os.getenv("BITRIX_RATE_LIMIT", 2))
+BITRIX_BURST = int(os.getenv("BITRIX_BURST", 50))
+BITRIX_WORKERS = int(os.getenv("BITRIX_WORKERS", 4))
+BITRIX_LIMITE_TENTATIVAS = int(os.getenv("BITRIX_LIMITE_TENTATIVAS", 5))
+# "batch" (padrão): até 50 CPFs por chamada; "individual": um user.update por CPF
+BITRIX_ENVIO_MODO = os.getenv("BITRIX_ENVIO_MODO", "batch")
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `taxa` fichas/s, acumulando até `capacidade`."""
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = float(capacidade)
+        self._ultimo = time.monotonic()
+        self._pausa_ate = 0.0
+        self._lock = threading.Lock()
+
+    def consumir(self):
+        """Bloqueia até haver uma ficha disponível."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                if agora >= self._pausa_ate:
+                    self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                    self._ultimo = agora
+                    if self._fichas >= 1:
+                        self._fichas -= 1
+                        return
+                    espera = (1 - self._fichas) / self.taxa
+                else:
+                    espera = self._pausa_ate - agora
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        """Esvazia o bucket e segura todos os envios por `segundos`."""
+        with self._lock:
+            self._fichas = 0.0
+            self._ultimo = time.monotonic() + segundos
+            self._pausa_ate = max(self._pausa_ate, self._ultimo)
+
+
+def pendentes_de_envio(itens):
+    """
+    Tira de `itens` ((id_bitrix, nome, cpf)) quem já teve exatamente esse
+    CPF aceito pelo Bitrix (MatchCPFCheck.cpf_enviado). Uma leitura só.
+    """
+    enviados = dict(
+        MatchCPFCheck.objects
+        .exclude(cpf_enviado__isnull=True)
+        .exclude(cpf_enviado="")
+        .values_list("id_bitrix", "cpf_enviado")
+    )
+    return [
+        (id_bitrix, nome, cpf)
+        for id_bitrix, nome, cpf in itens
+        if enviados.get(int(id_bitrix)) != str(cpf)
+    ]
+
+
+def despachar_cpfs(itens, workers=None, bucket=None, modo=None, run=None):
+    """
+    Envia CPFs ao Bitrix em paralelo (pool de threads limitado),
+    respeitando o token bucket e recuando quando o Bitrix responde
+    QUERY_LIMIT_EXCEEDED. `itens`: iterável de (id_bitrix, nome, cpf).
+    CPFs já aceitos pelo Bitrix não são reenviados (pendentes_de_envio).
+
+    No modo "batch" cada chamada leva até BITRIX_BATCH_TAMANHO CPFs;
+    os subcomandos que falharem são reenviados um a um.
+
+    Os LogAtualizacaoCPF dos envios bem-sucedidos são gravados no fim,
+    em um único bulk_create. Com `run` (SyncRun), registra o envio em
+    SyncDetail (ENVIO_CPF).
+    """
+    crono = Cronometro()
+    recebidos = list(itens)
+    itens = pendentes_de_envio(recebidos)
+    pulados = len(recebidos) - len(itens)
+    workers = workers or BITRIX_WORKERS
+    bucket = bucket or TokenBucket(BITRIX_RATE_LIMIT, BITRIX_BURST)
+    modo = modo or BITRIX_ENVIO_MODO
+
+    def com_recuo(envio, descricao):
+        for tentativa in range(BITRIX_LIMITE_TENTATIVAS + 1):
+            bucket.consumir()
+            resultado = envio()
+            if resultado[0] != ENVIO_LIMITE:
+                return resultado
+            bucket.pausar(2 ** tentativa)
+        print(f"Limite do Bitrix persistente; desistindo de {descricao}.")
+        return resultado
+
+    def enviar(item):
+        id_bitrix, _, cpf = item
+        status = com_recuo(lambda: (_enviar_cpf_bitrix(id_bitrix, cpf),), f"ID {id_bitrix}")[0]
+        return status == ENVIO_OK
+
+    def enviar_lote(lote):
+        pares = [(id_bitrix, cpf) for id_bitrix, _, cpf in lote]
+        _, oks = com_recuo(lambda: _enviar_lote_bitrix(pares), f"lote de {len(lote)} CPFs")
+        return oks
+
+    with crono.etapa("escrita"), ThreadPoolExecutor(max_workers=workers) as pool:
+        if modo == "batch":
+            lotes = [itens[i:i + BITRIX_BATCH_TAMANHO] for i in range(0, len(itens), BITRIX_BATCH_TAMANHO)]
+            resultados = [ok for oks in pool.map(enviar_lote, lotes) for ok in oks]
+
+            # subcomandos que falharam no batch: reenvio individual
+            falhas = [i for i, ok in enumerate(resultados) if not ok]
+            if falhas:
+                print(f"Reenviando individualmente {len(falhas)} CPFs que falharam no batch.")
+                for i, ok in zip(falhas, pool.map(enviar, [itens[i] for i in falhas])):
+                    resultados[i] = ok
+        else:
+            resultados = list(pool.map(enviar, itens))
+
+    logs = [
+        LogAtualizacaoCPF(id_bitrix=id_bitrix, nome=nome, cpf=cpf)
+        for (id_bitrix, nome, cpf), ok in zip(itens, resultados)
+        if ok
+    ]
+    LogAtualizacaoCPF.objects.bulk_create(logs)
+    marcar_cpfs_enviados(logs)
+
+    erros = len(itens) - len(logs)
+    registrar_etapa(
+        run, "ENVIO_CPF", crono, lidos=len(itens), gravados=len(logs), ignorados=pulados,
+        mensagem_erro=f"{erros} envios recusados/falharam" if erros else "",
+    )
+    return {"atualizados": len(logs), "erros": erros, "pulados": pulados}
+
+
+def marcar_cpfs_enviados(logs):
+    """
+    Grava em MatchCPFCheck o último CPF aceito pelo Bitrix, para que o
+    próximo envio pule quem não mudou. IDs sem check são ignorados.
+    """
+    agora = timezone.now()
+    checks = [
+        MatchCPFCheck(id_bitrix=log.id_bitrix, cpf_enviado=log.cpf, cpf_enviado_em=agora)
+        for log in logs
+    ]
+    MatchCPFCheck.objects.bulk_update(checks, ["cpf_enviado", "cpf_enviado_em"], batch_size=500)
 
 
 # ======================================================
@@ -234,35 +836,19 @@ def executar_sincronizacao_completa():
     msg_ponto = sync_colaboradores_ponto()
     msg_bitrix = sync_usuarios_bitrix()
 
-    usuarios_bitrix = UsuarioBitrix.objects.all()
-    atualizados_count = 0
-
-    for u_bitrix in usuarios_bitrix:
-        try:
-            colab_ponto = ColaboradorPonto.objects.get(nome_completo=u_bitrix.nome)
-            cpf = colab_ponto.cpf
-
-            if cpf:
-                sucesso = enviar_cpf_bitrix(u_bitrix.id_bitrix, cpf)
+    envios = []
+    for r in resultados_match():
+        if r.ok:
+            envios.append((r.id_bitrix, r.nome, r.cpf))
+        elif r.status == MatchCPFCheck.STATUS_DUPLICADO:
+            print(f"AVISO: Múltiplos registros encontrados para {r.nome}. Pulando.")
 
-                if sucesso:
-                    LogAtualizacaoCPF.objects.create(
-                        id_bitrix=u_bitrix.id_bitrix,
-                        nome=u_bitrix.nome,
-                        cpf=cpf
-                    )
-                    atualizados_count += 1
-
-        except ColaboradorPonto.DoesNotExist:
-            continue
-        except ColaboradorPonto.MultipleObjectsReturned:
-            print(f"AVISO: Múltiplos registros encontrados para {u_bitrix.nome}. Pulando.")
-            continue
+    resultado = despachar_cpfs(envios)
 
     return {
         "ponto_msg": msg_ponto,
         "bitrix_msg": msg_bitrix,
-        "atualizados": atualizados_count
+        "atualizados": resultado["atualizados"]
     }
 
 
@@ -276,73 +862,36 @@ def atualizar_cpfs_no_bitrix():
     Não sincroniza bases locais.
     """
 
-    # Mapa nome -> lista de CPFs (para detectar duplicados)
-    ponto_map = {}
-    for c in ColaboradorPonto.objects.exclude(cpf__isnull=True).exclude(cpf=""):
-        ponto_map.setdefault(c.nome_completo, []).append(c.cpf)
-
-    atualizados = 0
-    sem_match = 0
-    duplicados = 0
-    erros = 0
+    resultados = list(resultados_match())
+    por_status = contar_status(resultados)
+    envios = [(r.id_bitrix, r.nome, r.cpf) for r in resultados if r.ok]
 
-    for u in UsuarioBitrix.objects.all():
-        cpfs = ponto_map.get(u.nome)
-
-        if not cpfs:
-            sem_match += 1
-            continue
-
-        if len(cpfs) > 1:
-            duplicados += 1
-            continue
-
-        cpf = cpfs[0]
-
-        sucesso = enviar_cpf_bitrix(u.id_bitrix, cpf)
-        if sucesso:
-            LogAtualizacaoCPF.objects.create(
-                id_bitrix=u.id_bitrix,
-                nome=u.nome,
-                cpf=cpf
-            )
-            atualizados += 1
-        else:
-            erros += 1
+    resultado = despachar_cpfs(envios)
+    atualizados = resultado["atualizados"]
+    erros = resultado["erros"]
 
     return {
         "atualizados": atualizados,
-        "sem_match": sem_match,
-        "duplicados": duplicados,
+        "sem_match": por_status[MatchCPFCheck.STATUS_SEM_MATCH],
+        "duplicados": por_status[MatchCPFCheck.STATUS_DUPLICADO],
         "erros": erros,
     }
 
-def enviar_cpfs_ok_do_check():
+def enviar_cpfs_ok_do_check(run=None):
     """
     Envia ao Bitrix apenas os registros que estão com status OK na tabela MatchCPFCheck.
     Assim, o envio fica consistente com a checagem exibida na tela.
+    Registros cujo CPF já foi aceito pelo Bitrix (cpf_enviado) não são reenviados.
     """
     qs = (
         MatchCPFCheck.objects
         .filter(status=MatchCPFCheck.STATUS_OK)
         .exclude(cpf__isnull=True)
         .exclude(cpf="")
+        # mesmo filtro de pendentes_de_envio, já no SQL: não lê o que será pulado
+        .exclude(cpf_enviado=F("cpf"))
     )
 
-    atualizados = 0
-    erros = 0
-
-    for item in qs:
-        sucesso = enviar_cpf_bitrix(item.id_bitrix, item.cpf)
-
-        if sucesso:
-            LogAtualizacaoCPF.objects.create(
-                id_bitrix=item.id_bitrix,
-                nome=item.nome,
-                cpf=item.cpf
-            )
-            atualizados += 1
-        else:
-            erros += 1
+    envios = qs.values_list("id_bitrix", "nome", "cpf")
 
-    return {"atualizados": atualizados, "erros": erros}
+    return despachar_cpfs(envios, run=run)
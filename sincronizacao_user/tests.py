@@ -0,0 +1,170 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import SyncJob
+from core.services.http import get_session
+from core.testing import OrcamentoSQLTestMixin
+from sincronizacao_user import services
+from sincronizacao_user.models import LogAtualizacaoCPF, MarcaIncremental, MatchCPFCheck
+from sincronizacao_user.services import (
+    ENVIO_OK, MYSQL_MARCA_BITRIX, MYSQL_MARCA_PONTO, TokenBucket, decidir_carga, despachar_cpfs,
+)
+
+
+class RelogioFalso:
+    """Substitui time.monotonic/time.sleep: dormir só avança o relógio."""
+
+    def __init__(self):
+        self.agora = 1000.0
+        self.dormiu = []
+
+    def monotonic(self):
+        return self.agora
+
+    def sleep(self, segundos):
+        self.dormiu.append(segundos)
+        self.agora += segundos
+
+
+# ======================================================
+# RATE LIMIT DO BITRIX
+# ======================================================
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.relogio = RelogioFalso()
+        for nome in ("monotonic", "sleep"):
+            patcher = mock.patch.object(services.time, nome, getattr(self.relogio, nome))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rajada_ate_a_capacidade_sem_esperar(self):
+        bucket = TokenBucket(taxa=2, capacidade=3)
+        for _ in range(3):
+            bucket.consumir()
+        self.assertEqual(self.relogio.dormiu, [])
+
+    def test_sem_fichas_espera_a_reposicao(self):
+        bucket = TokenBucket(taxa=2, capacidade=1)
+        bucket.consumir()
+        bucket.consumir()
+        self.assertEqual(self.relogio.dormiu, [0.5])
+
+    def test_reposicao_nao_passa_da_capacidade(self):
+        bucket = TokenBucket(taxa=2, capacidade=2)
+        bucket.consumir()
+        bucket.consumir()
+        self.relogio.agora += 60
+        for _ in range(3):
+            bucket.consumir()
+        self.assertEqual(self.relogio.dormiu, [0.5])
+
+    def test_pausa_segura_os_envios(self):
+        bucket = TokenBucket(taxa=2, capacidade=5)
+        bucket.pausar(4)
+        inicio = self.relogio.agora
+
+        bucket.consumir()
+
+        # espera a pausa inteira e depois a primeira ficha
+        self.assertEqual(self.relogio.agora - inicio, 4.5)
+
+
+class SessaoHttpTests(SimpleTestCase):
+    def test_post_nao_repete_dentro_do_urllib3(self):
+        retry = get_session().get_adapter("https://bitrix.local/").max_retries
+        self.assertFalse(retry.is_retry("POST", 503, has_retry_after=True))
+        self.assertTrue(retry.is_retry("GET", 503))
+
+
+# ======================================================
+# ENVIO DE CPFS
+# ======================================================
+
+class DespacharCpfsTests(TestCase):
+    def setUp(self):
+        MatchCPFCheck.objects.create(id_bitrix=1, nome="Ana", cpf="111", status=MatchCPFCheck.STATUS_OK, cpf_enviado="111")
+        MatchCPFCheck.objects.create(id_bitrix=2, nome="Bia", cpf="222", status=MatchCPFCheck.STATUS_OK, cpf_enviado="200")
+        MatchCPFCheck.objects.create(id_bitrix=3, nome="Caio", cpf="333", status=MatchCPFCheck.STATUS_OK)
+
+    def despachar(self, itens):
+        with mock.patch.object(services, "_enviar_cpf_bitrix", return_value=ENVIO_OK) as enviar:
+            resultado = despachar_cpfs(itens, workers=1, bucket=TokenBucket(1000, 1000), modo="individual")
+        return resultado, sorted(c.args for c in enviar.call_args_list)
+
+    def test_nao_reenvia_cpf_ja_aceito(self):
+        resultado, enviados = self.despachar([(1, "Ana", "111"), (2, "Bia", "222"), (3, "Caio", "333")])
+
+        self.assertEqual(enviados, [(2, "222"), (3, "333")])
+        self.assertEqual(resultado, {"atualizados": 2, "erros": 0, "pulados": 1})
+        self.assertEqual(MatchCPFCheck.objects.get(pk=2).cpf_enviado, "222")
+        self.assertEqual(LogAtualizacaoCPF.objects.count(), 2)
+
+    def test_segundo_envio_nao_repete_nada(self):
+        itens = [(2, "Bia", "222"), (3, "Caio", "333")]
+        self.despachar(itens)
+
+        resultado, enviados = self.despachar(itens)
+
+        self.assertEqual(enviados, [])
+        self.assertEqual(resultado["pulados"], 2)
+
+
+# ======================================================
+# ORÇAMENTO DE SQL DA TELA
+# ======================================================
+
+@override_settings(CHECKS_PAGE_SIZE=20)
+class IndexOrcamentoSQLTests(OrcamentoSQLTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        status = [MatchCPFCheck.STATUS_OK, MatchCPFCheck.STATUS_SEM_MATCH, MatchCPFCheck.STATUS_DUPLICADO]
+        MatchCPFCheck.objects.bulk_create(
+            MatchCPFCheck(id_bitrix=i, nome=f"Usuário {i}", cpf=f"{i:011d}", status=status[i % 3])
+            for i in range(1, 101)
+        )
+        LogAtualizacaoCPF.objects.bulk_create(
+            LogAtualizacaoCPF(id_bitrix=i, nome=f"Usuário {i}", cpf=f"{i:011d}") for i in range(1, 61)
+        )
+        SyncJob.objects.create(tipo=SyncJob.TIPO_RUN_SYNC, status=SyncJob.STATUS_SUCESSO)
+        cls.staff = User.objects.create_user("adm", is_staff=True)
+
+    def test_index(self):
+        url = reverse("sincronizacao_user:index")
+        self.client.force_login(self.staff)
+        for filtros in ({}, {"page": 3}, {"status": MatchCPFCheck.STATUS_OK}, {"q": "Usuário 1"}):
+            with self.subTest(filtros=filtros):
+                resp = self.assertDentroDoOrcamento(url, data=filtros)
+                self.assertEqual(resp.status_code, 200)
+                self.assertLessEqual(len(resp.context["checks"]), 20)
+
+
+# ======================================================
+# CARGA INCREMENTAL DO MYSQL
+# ======================================================
+
+class DecidirCargaTests(TestCase):
+    def marcar(self, tabela, coluna, horas_desde_completa):
+        MarcaIncremental.objects.create(
+            pk=tabela, coluna=coluna, valor="10",
+            ultima_completa_em=timezone.now() - timedelta(hours=horas_desde_completa),
+        )
+
+    def test_ponto_e_sempre_completo_por_padrao(self):
+        self.assertEqual(MYSQL_MARCA_PONTO, "")
+        self.marcar("ponto", "id", 1)
+        self.assertEqual(decidir_carga("ponto", MYSQL_MARCA_PONTO), (None, True))
+
+    def test_incremental_com_marca_recente(self):
+        self.marcar("bitrix", MYSQL_MARCA_BITRIX, 1)
+        self.assertEqual(decidir_carga("bitrix", MYSQL_MARCA_BITRIX), ("10", False))
+
+    def test_completa_vencida_ou_coluna_trocada(self):
+        self.marcar("bitrix", MYSQL_MARCA_BITRIX, 48)
+        self.assertEqual(decidir_carga("bitrix", MYSQL_MARCA_BITRIX), (None, True))
+        self.assertEqual(decidir_carga("bitrix", "OUTRA"), (None, True))
@@ -1,31 +1,82 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
 from django.views.decorators.http import require_POST
 
-from .models import LogAtualizacaoCPF, ColaboradorPonto, UsuarioBitrix, MatchCPFCheck
-from .services import (
-    sync_colaboradores_ponto,
-    sync_usuarios_bitrix,
-    atualizar_cpfs_no_bitrix,
-    gerar_checks_match_persistidos,
-    enviar_cpfs_ok_do_check
-)
+from core.models import SyncJob
+from core.services.jobs import enfileirar
+from core.services.perfil_sql import orcamento_sql
+from .models import LogAtualizacaoCPF, MatchCPFCheck, EstadoMatch
 
 
+@orcamento_sql(12)
 def index(request):
-    stats = gerar_checks_match_persistidos()
+    # somente leitura: os checks e as estatísticas são regerados pelos jobs
+    # (sync_bases/run_sync) quando as bases mudam; ver EstadoMatch
+    estado = EstadoMatch.atual()
+
+    # filtros da checagem (servidor): status e busca por nome/CPF
+    status = request.GET.get("status") or ""
+    if status not in dict(MatchCPFCheck.STATUS_CHOICES):
+        status = ""
+    q = (request.GET.get("q") or "").strip()
+
+    checks = MatchCPFCheck.objects.only("id_bitrix", "nome", "cpf", "status", "obs")
+    if status:
+        checks = checks.filter(status=status)
+    if q:
+        checks = checks.filter(Q(nome__icontains=q) | Q(cpf__contains=q))
+
+    # contagem por status numa consulta agregada (badges do filtro)
+    por_status = dict(
+        MatchCPFCheck.objects.values_list("status").annotate(n=Count("pk")).order_by()
+    )
+    contagens = {
+        "total": sum(por_status.values()),
+        **{s: por_status.get(s, 0) for s, _ in MatchCPFCheck.STATUS_CHOICES},
+    }
+
+    paginator = Paginator(checks.order_by("status", "nome", "id_bitrix"), settings.CHECKS_PAGE_SIZE)
+    if not q:
+        # sem busca, o total já saiu da agregação acima: poupa o COUNT
+        paginator.count = contagens[status] if status else contagens["total"]
+    pagina = paginator.get_page(request.GET.get("page"))
+
+    params = request.GET.copy()
+    params.pop("page", None)
 
-    checks = MatchCPFCheck.objects.all()
     logs = LogAtualizacaoCPF.objects.all().order_by('-data_atualizacao')[:50]
+    job = (
+        SyncJob.objects
+        .filter(tipo__in=(SyncJob.TIPO_SYNC_BASES, SyncJob.TIPO_RUN_SYNC))
+        .order_by("-created_at")
+        .first()
+    )
 
     return render(request, "sincronizacao_user/index.html", {
         "logs": logs,
         "titulo": "Sincronização de Usuários",
-        "checks": checks,
-        "stats": stats
+        "checks": pagina,
+        "contagens": contagens,
+        "status_sel": status,
+        "q": q,
+        "filtros_qs": params.urlencode(),
+        "stats": estado.stats,
+        "estado": estado,
+        "job": job,
     })
 
 
+def _enfileirar_com_mensagem(request, tipo, descricao):
+    job, criado = enfileirar(tipo, request.user)
+    if criado:
+        messages.success(request, f"{descricao} enfileirado (job #{job.id}). Acompanhe o status nesta tela.")
+    else:
+        messages.info(request, f"{descricao} já está na fila ou em execução (job #{job.id}).")
+
+
 
 @require_POST
 def sync_bases(request):
@@ -34,17 +85,10 @@ def sync_bases(request):
     - Atualiza bases locais (Ponto e Bitrix)
     - NÃO envia Bitrix
     - Checagem será gerada automaticamente na tela (ou após sync)
+    - Roda em segundo plano (fila de jobs)
     """
-    try:
-        msg_ponto = sync_colaboradores_ponto()
-        msg_bitrix = sync_usuarios_bitrix()
-
-        messages.success(request, f"{msg_ponto} {msg_bitrix}")
-        return redirect("sincronizacao_user:index")
-
-    except Exception as e:
-        messages.error(request, f"Ocorreu um erro ao atualizar bases: {str(e)}")
-        return redirect('sincronizacao_user:index')
+    _enfileirar_com_mensagem(request, SyncJob.TIPO_SYNC_BASES, "Atualização das bases")
+    return redirect("sincronizacao_user:index")
 
 @require_POST
 def run_sync(request):
@@ -53,23 +97,8 @@ def run_sync(request):
     - Envia CPFs ao Bitrix utilizando a tabela MatchCPFCheck
     - NÃO recalcula match aqui
     - NÃO atualiza bases locais
+    - Roda em segundo plano (fila de jobs)
     """
-    try:
-        # opcional: garantir que a tabela está atualizada antes do envio
-        gerar_checks_match_persistidos()
-
-        resultado = enviar_cpfs_ok_do_check()
-
-        if resultado["atualizados"] > 0:
-            messages.success(request, f"Sucesso! {resultado['atualizados']} usuários tiveram CPFs atualizados no Bitrix.")
-        else:
-            messages.warning(request, "Nenhum CPF precisou ser atualizado nesta rodada.")
-
-        if resultado["erros"] > 0:
-            messages.error(request, f"Atenção: {resultado['erros']} erros ocorreram durante o envio ao Bitrix.")
-
-    except Exception as e:
-        messages.error(request, f"Ocorreu um erro durante a atualização no Bitrix: {str(e)}")
-
+    _enfileirar_com_mensagem(request, SyncJob.TIPO_RUN_SYNC, "Envio ao Bitrix")
     return redirect('sincronizacao_user:index')
 
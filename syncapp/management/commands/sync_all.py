@@ -1,4 +1,7 @@
-from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import wraps
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from core.models import (
     BitrixUser, PontoContact, GesttaUser, DominioAccount, CcontrolWebUser, VisaoLogicaUser,
@@ -10,47 +13,336 @@ from core.services.fetch_gestta import fetch_gestta
 from core.services.fetch_dominio import fetch_dominio
 from core.services.fetch_ccontrolweb import fetch_ccontrolweb
 from core.services.fetch_visaologica import fetch_visaologica
+from core.services.bulk import bulk_inserir, bulk_upsert, sincronizar_diff
+from core.services.progresso import Progresso
+from core.services.reconciliacao import (
+    RastreadorAlteracoes, reconciliar_incremental, reconstruir_resultados
+)
 import json
+import time
+
+
+class _Stream:
+    """Iterador preguiçoso de uma fonte: a requisição só começa ao iterar."""
+
+    def __init__(self, abrir, metricas):
+        self._abrir = abrir
+        self.metricas = metricas
+
+    def __iter__(self):
+        return iter(self._abrir())
+
+
+def _etapa(metodo):
+    """
+    Etapa de gravação de uma fonte. Com os dados já baixados roda numa
+    transação só; no modo streaming cada lote confirma sozinho, para não
+    segurar a trava de escrita do SQLite durante o download inteiro (por
+    isso o streaming só roda no modo diff).
+    """
+    @wraps(metodo)
+    def executar(self, *args, **kwargs):
+        if self.stream:
+            return metodo(self, *args, **kwargs)
+        with transaction.atomic():
+            return metodo(self, *args, **kwargs)
+    return executar
 
 
 class Command(BaseCommand):
-    help = "Baixa dados das APIs e grava no banco (ordem: Bitrix, Ponto, Gestta, Dominio, CControlWeb, Visão Lógica)."
+    help = "Baixa dados das APIs (em paralelo) e grava no banco (ordem: Bitrix, Ponto, Gestta, Dominio, CControlWeb, Visão Lógica)."
+
+    # (fonte no SyncDetail, chave no RastreadorAlteracoes, etapa de gravação)
+    ETAPAS = [
+        ("BITRIX", None, "sync_bitrix"),
+        ("PONTO", "ponto", "sync_ponto"),
+        ("GESTTA", "gestta", "sync_gestta"),
+        ("DOMINIO", "dominio", "sync_dominio"),
+        ("CCONTROLWEB", "web", "sync_ccontrolweb"),
+        ("VISAOLOGICA", "visao", "sync_visaologica"),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reconciliacao-completa",
+            action="store_true",
+            help="Recalcula a conciliação de todos os usuários (ignora o modo incremental).",
+        )
+        parser.add_argument(
+            "--modo",
+            choices=["diff", "flush"],
+            default="diff",
+            help="diff: grava só o que mudou (padrão); flush: apaga e recarrega as tabelas.",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help=(
+                "Lê cada fonte em streaming, gravando (e confirmando) os lotes enquanto o "
+                "download acontece. Uma falha no meio mantém os lotes já gravados. "
+                "Só no modo diff."
+            ),
+        )
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=None,
+            help="Registros por lote de gravação (padrão: settings.SYNC_CHUNK_SIZE).",
+        )
 
     def handle(self, *args, **options):
+        self.chunk_size = options.get("chunk")
+        self.modo = options.get("modo") or "diff"
+        self.stream = options.get("stream", False)
+        if self.stream and self.modo == "flush":
+            # no streaming cada lote confirma sozinho: o flush apagaria a tabela
+            # (e, no Bitrix, a conciliação em cascata) antes do download terminar
+            raise CommandError("--stream não pode ser usado com --modo flush.")
         run = SyncRun.objects.create(status="running")
+        inicio_run = time.perf_counter()
+        self.progresso = Progresso(run.id)
+        self.metricas_fetch = {}
+        alteracoes = RastreadorAlteracoes()
         try:
-            self.sync_bitrix(run)
-            self.sync_ponto(run)
-            self.sync_gestta(run)
-            self.sync_dominio(run)
-            self.sync_ccontrolweb(run)
-            self.sync_visaologica(run)
+            baixados = self.fetch_stream() if self.stream else self.fetch_todos()
+
+            falhas = []
+            for fonte, chave, etapa in self.ETAPAS:
+                data, duracao, erro = baixados[fonte]
+                if erro is not None:
+                    # isola a falha: registra a fonte e segue com as demais
+                    falhas.append(self._registrar_falha(run, fonte, erro, duracao))
+                    continue
+                self.progresso.iniciar(fonte, "gravacao")
+                if self.stream:
+                    metricas = data.metricas
+                    try:
+                        with alteracoes.observar(chave) if chave else nullcontext():
+                            inicio = time.perf_counter()
+                            item = getattr(self, etapa)(run, data)
+                            duracao_etapa = time.perf_counter() - inicio
+                    except Exception as e:
+                        # mesma isolação do _baixar: qualquer falha no meio do stream
+                        # (rede, JSON, dado inesperado) fica só nesta fonte; os lotes
+                        # já gravados ficam, as remoções não acontecem e o próximo
+                        # sync converge
+                        falhas.append(self._registrar_falha(run, fonte, e, metricas.get("duracao")))
+                        continue
+                    self._registrar_tempos(item, metricas, duracao_etapa)
+                    self.progresso.concluir(fonte, item.lidos)
+                    continue
+
+                with alteracoes.observar(chave) if chave else nullcontext():
+                    inicio = time.perf_counter()
+                    item = getattr(self, etapa)(run, data, duracao)
+                    duracao_etapa = time.perf_counter() - inicio
+                self._registrar_tempos(item, self.metricas_fetch.get(fonte, {}), duracao_etapa)
+                self.progresso.concluir(fonte, item.lidos)
+
+            self.reconciliar(run, alteracoes, completa=options["reconciliacao_completa"])
+            if falhas:
+                raise CommandError("Falha ao baixar " + "; ".join(falhas))
             run.status = "success"
+            run.duracao_total = time.perf_counter() - inicio_run
             run.save()
+            self.progresso.finalizar(run.status)
             self.stdout.write(self.style.SUCCESS(f"✅ Sync concluído (run={run.id})"))
         except Exception as e:
             run.status = "error"
             run.mensagem = str(e)
+            run.duracao_total = time.perf_counter() - inicio_run
             run.save()
+            self.progresso.finalizar(run.status)
             raise
 
+    def _registrar_tempos(self, item, metricas, duracao_etapa):
+        """
+        Quebra o tempo da fonte em fetch / decode / transform / escrita.
+        transform = tempo montando as instâncias (gerador), sem contar a
+        leitura dos registros; escrita = resto da etapa (banco).
+        No modo streaming fetch e decode acontecem dentro da etapa.
+        """
+        t_fonte = getattr(item, "_t_fonte", 0.0)
+        t_gerador = getattr(item, "_t_gerador", 0.0)
+
+        if metricas.get("duracao") is not None:
+            item.duracao_fetch = metricas["duracao"]
+        item.duracao_decode = metricas.get("decode")
+        item.bytes_baixados = metricas.get("bytes")
+        item.duracao_transform = max(0.0, t_gerador - t_fonte)
+        item.duracao_escrita = max(0.0, duracao_etapa - t_gerador)
+        item.duracao_total = duracao_etapa
+        if not self.stream:
+            # download aconteceu antes, em paralelo: soma ao total da fonte
+            item.duracao_total += item.duracao_fetch or 0.0
+
+        item.save(update_fields=[
+            "duracao_fetch", "duracao_decode", "bytes_baixados",
+            "duracao_transform", "duracao_escrita", "duracao_total",
+        ])
+        print(
+            f"   ⏱ {item.fonte}: fetch {item.duracao_fetch or 0:.2f}s, decode {item.duracao_decode or 0:.2f}s, "
+            f"transform {item.duracao_transform:.2f}s, escrita {item.duracao_escrita:.2f}s "
+            f"({item.linhas_por_segundo or 0} linhas/s)"
+        )
+
+    def _registrar_falha(self, run, fonte, erro, duracao):
+        # no streaming a etapa já pode ter criado o SyncDetail da fonte
+        SyncDetail.objects.update_or_create(
+            run=run, fonte=fonte,
+            defaults={"duracao_fetch": duracao, "mensagem_erro": str(erro)},
+        )
+        self.progresso.falhar(fonte, erro)
+        print(f"✖ {fonte} - falha no download: {erro}")
+        return f"{fonte}: {erro}"
+
+    def _fetchers(self):
+        return {
+            "BITRIX": fetch_bitrix,
+            "PONTO": fetch_ponto,
+            "GESTTA": fetch_gestta,
+            "DOMINIO": fetch_dominio,
+            "CCONTROLWEB": fetch_ccontrolweb,
+            "VISAOLOGICA": fetch_visaologica,
+        }
+
+    def fetch_stream(self):
+        """
+        Modo streaming: não baixa nada aqui; cada fonte vira um iterador
+        preguiçoso consumido pela própria etapa de gravação.
+        Retorna {fonte: (iterador, None, None)}.
+        """
+        baixados = {}
+        for fonte, fn in self._fetchers().items():
+            metricas = {}
+            baixados[fonte] = (_Stream(lambda fn=fn, m=metricas: fn(stream=True, metricas=m), metricas), None, None)
+        return baixados
+
+    def fetch_todos(self):
+        """
+        Baixa todas as fontes em paralelo (cada fetcher mantém seu timeout).
+        Retorna {fonte: (dados, duracao_em_segundos, erro)}.
+        """
+        fetchers = self._fetchers()
+        with ThreadPoolExecutor(max_workers=len(fetchers)) as pool:
+            futuros = {fonte: pool.submit(self._baixar, fonte, fn) for fonte, fn in fetchers.items()}
+        baixados = {fonte: f.result() for fonte, f in futuros.items()}
+
+        for fonte, (data, duracao, erro) in baixados.items():
+            if erro is None:
+                print(f"⬇ {fonte} - {len(data)} registros baixados em {duracao:.2f}s")
+        return baixados
+
+    def _baixar(self, fonte, fetch):
+        inicio = time.perf_counter()
+        self.progresso.iniciar(fonte, "download")
+        metricas = self.metricas_fetch.setdefault(fonte, {})
+        try:
+            data = fetch(metricas=metricas)
+        except Exception as e:
+            return None, time.perf_counter() - inicio, e
+        self.progresso.concluir(fonte, len(data))
+        return data, time.perf_counter() - inicio, None
+
+    def reconciliar(self, run, alteracoes, completa=False):
+        """
+        Atualiza a tabela materializada ReconciliationResult.
+        No modo incremental só recalcula os usuários afetados pelas alterações.
+        """
+        item = SyncDetail.objects.create(run=run, fonte="RECONCILIACAO")
+        self.progresso.iniciar("RECONCILIACAO", "conciliacao")
+        inicio = time.perf_counter()
+        if completa:
+            recalculados, ignorados = reconstruir_resultados(), 0
+        else:
+            recalculados, ignorados = reconciliar_incremental(alteracoes)
+        item.lidos = recalculados + ignorados
+        item.gravados = recalculados
+        item.ignorados = ignorados
+        item.duracao_escrita = item.duracao_total = time.perf_counter() - inicio
+        item.save()
+        self.progresso.concluir("RECONCILIACAO", item.lidos)
+        print(f"✔ CONCILIAÇÃO - {recalculados} usuários recalculados, {ignorados} sem alteração")
+
+    def _linhas(self, item, data):
+        """
+        Itera os registros (lista ou stream) contando os lidos no SyncDetail
+        e o tempo gasto só para obtê-los (item._t_fonte).
+        """
+        item.lidos = 0
+        item._t_fonte = 0.0
+        it = iter(data)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                row = next(it)
+            except StopIteration:
+                item._t_fonte += time.perf_counter() - inicio
+                return
+            item._t_fonte += time.perf_counter() - inicio
+            item.lidos += 1
+            if item.lidos % 500 == 0:
+                self.progresso.avancar(item.fonte, item.lidos)
+            yield row
+
+    @staticmethod
+    def _cronometrar(item, objs):
+        """Envolve o gerador de instâncias medindo o tempo gasto nele (item._t_gerador)."""
+        item._t_gerador = 0.0
+        it = iter(objs)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                obj = next(it)
+            except StopIteration:
+                item._t_gerador += time.perf_counter() - inicio
+                return
+            item._t_gerador += time.perf_counter() - inicio
+            yield obj
+
     def _flush(self, queryset):
         """Limpa a tabela antes de repopular (modo MVP)."""
-        deleted, _ = queryset.all().delete()
-        return deleted
+        _, por_modelo = queryset.all().delete()
+        # ignora as linhas apagadas em cascata (ex.: ReconciliationResult)
+        return por_modelo.get(queryset.model._meta.label, 0)
+
+    def _gravar(self, item, model, objs, campos, chave=None, rotulo=None):
+        """
+        Grava as instâncias (lista ou gerador) conforme o modo:
+        - flush: apaga a tabela e insere tudo em lote;
+        - diff: insere/atualiza/remove só o que mudou (hash_conteudo).
+        Preenche os contadores do SyncDetail e retorna quantos foram gravados.
+        """
+        objs = self._cronometrar(item, objs)
+        if self.modo == "flush":
+            item.removidos = self._flush(model.objects)
+            item.inseridos = bulk_inserir(model, objs, chunk_size=self.chunk_size, rotulo=rotulo)
+            item.gravados = item.inseridos
+            return item.gravados
+
+        res = sincronizar_diff(model, objs, campos, chave=chave, chunk_size=self.chunk_size, rotulo=rotulo)
+        item.inseridos = res["inseridos"]
+        item.atualizados = res["atualizados"]
+        item.removidos = res["removidos"]
+        item.inalterados = res["inalterados"]
+        # chave repetida na fonte: só a última ocorrência vale
+        item.ignorados += res["duplicados"]
+        item.gravados = item.inseridos + item.atualizados
+        print(
+            f"   {rotulo}: {item.inseridos} inseridos, {item.atualizados} atualizados, "
+            f"{item.removidos} removidos, {item.inalterados} inalterados, "
+            f"{res['duplicados']} duplicados"
+        )
+        return item.gravados
 
     # ==================================================
     # BITRIX
     # ==================================================
-    @transaction.atomic
-    def sync_bitrix(self, run):
-        item = SyncDetail.objects.create(run=run, fonte="BITRIX")
-        data = fetch_bitrix()
-        item.lidos = len(data)
-        self._flush(BitrixUser.objects)
-        gravados = 0
-        for row in data:
-            BitrixUser.objects.create(
+    @_etapa
+    def sync_bitrix(self, run, data, duracao_fetch=None):
+        item = SyncDetail.objects.create(run=run, fonte="BITRIX", duracao_fetch=duracao_fetch)
+        usuarios = (
+            BitrixUser(
                 status=(row.get("Status") or "").strip() or None,
                 nome_user=(row.get("name") or "").strip() or None,
                 nome_completo=(row.get("Nome_Completo") or "").strip() or None,
@@ -60,188 +352,217 @@ class Command(BaseCommand):
                 email=(row.get("email") or "").strip() or None,
                 fonte_raw=row,
             )
-            gravados += 1
-        item.gravados = gravados
+            for row in self._linhas(item, data)
+        )
+        gravados = self._gravar(
+            item, BitrixUser, usuarios,
+            campos=["status", "nome_user", "nome_completo", "user_dominio",
+                    "user_local", "departamento_principal", "email"],
+            rotulo="BITRIX",
+        )
         item.save()
         print(f"✔ BITRIX - {gravados} registros gravados")
+        return item
 
     # ==================================================
     # PONTO
     # ==================================================
-    @transaction.atomic
-    def sync_ponto(self, run):
-        item = SyncDetail.objects.create(run=run, fonte="PONTO")
-        data = fetch_ponto()
-        item.lidos = len(data)
-        self._flush(PontoContact.objects)
-        gravados = 0
-        for row in data:
-            PontoContact.objects.create(
+    @_etapa
+    def sync_ponto(self, run, data, duracao_fetch=None):
+        item = SyncDetail.objects.create(run=run, fonte="PONTO", duracao_fetch=duracao_fetch)
+        contatos = (
+            PontoContact(
                 status_ponto=(row.get("status_sigla") or "").strip(),
                 nome_completo=(row.get("nome_completo") or "").strip(),
                 fonte_raw=row,
             )
-            gravados += 1
-        item.gravados = gravados
+            for row in self._linhas(item, data)
+        )
+        gravados = self._gravar(
+            item, PontoContact, contatos,
+            campos=["status_ponto", "nome_completo"],
+            rotulo="PONTO",
+        )
         item.save()
         print(f"✔ PONTO - {gravados} registros gravados")
+        return item
 
     # ==================================================
     # GESTTA
     # ==================================================
-    @transaction.atomic
-    def sync_gestta(self, run):
-        item = SyncDetail.objects.create(run=run, fonte="GESTTA")
-        data = fetch_gestta()
-        item.lidos = len(data)
-        self._flush(GesttaUser.objects)
-        gravados = 0
-        for row in data:
-            GesttaUser.objects.create(
+    @_etapa
+    def sync_gestta(self, run, data, duracao_fetch=None):
+        item = SyncDetail.objects.create(run=run, fonte="GESTTA", duracao_fetch=duracao_fetch)
+        usuarios = (
+            GesttaUser(
                 name=(row.get("name") or "").strip(),
                 email=(row.get("email") or "").strip(),
                 fonte_raw=row,
             )
-            gravados += 1
-        item.gravados = gravados
+            for row in self._linhas(item, data)
+        )
+        gravados = self._gravar(
+            item, GesttaUser, usuarios,
+            campos=["name", "email"], chave="email",
+            rotulo="GESTTA",
+        )
         item.save()
         print(f"✔ GESTTA - {gravados} registros gravados")
+        return item
 
     # ==================================================
     # DOMÍNIO
     # ==================================================
-    @transaction.atomic
-    def sync_dominio(self, run):
-        
-        # fetch_dominio já executa o upsert no banco e retorna contagens
-        res = fetch_dominio()
-
-        # Se fetch_dominio retornou um dict com contagens, só registre e finalize.
-        if isinstance(res, dict) and {"lidos", "gravados", "ignorados"} <= set(res.keys()):
-            lidos = int(res.get("lidos") or 0)
-            gravados = int(res.get("gravados") or 0)
-            ignorados = int(res.get("ignorados") or 0)
-            print(f"✔ DOMÍNIO - {gravados} registros gravados")
-            run.details.create(fonte="DOMINIO", lidos=lidos, gravados=gravados, ignorados=ignorados)
-            return
-
-        # (fallback) Se algum dia fetch_dominio voltar a retornar lista de itens,
-        # este trecho mantém compatibilidade — mas hoje não deve ser usado.
-        data = res
-        lidos = gravados = ignorados = 0
-
-        import json
-        from core.models import DominioAccount
-
-        for row in data:
-            lidos += 1
-            if isinstance(row, str):
-                try:
-                    row = json.loads(row.replace("'", '"'))
-                except Exception:
-                    ignorados += 1
+    @_etapa
+    def sync_dominio(self, run, data, duracao_fetch=None):
+        """Etapa de gravação do Domínio: chave I_SECUSUARIOS (id_externo)."""
+        item = SyncDetail.objects.create(run=run, fonte="DOMINIO", duracao_fetch=duracao_fetch)
+
+        def contas():
+            for row in self._linhas(item, data):
+                if isinstance(row, str):
+                    try:
+                        row = json.loads(row.replace("'", '"'))
+                    except Exception:
+                        item.ignorados += 1
+                        continue
+
+                # Ignora registros nulos, vazios ou inválidos
+                if not row or not isinstance(row, dict):
+                    item.ignorados += 1
                     continue
 
-            codigo = row.get("I_SECUSUARIOS")
-            nome = (row.get("NOME") or "").strip()
-            if not nome or codigo is None:
-                ignorados += 1
-                continue
+                codigo = row.get("I_SECUSUARIOS")
+                nome = (row.get("NOME") or "").strip()
+                if not nome or codigo is None:
+                    item.ignorados += 1
+                    continue
 
-            try:
-                DominioAccount.objects.update_or_create(
-                    id_externo=codigo,
-                    defaults={"nome": nome, "fonte_raw": row},
-                )
-                gravados += 1
-            except Exception:
-                ignorados += 1
+                try:
+                    codigo = int(codigo)
+                except (TypeError, ValueError):
+                    item.ignorados += 1
+                    print(f"⚠️ Código inválido no registro {codigo} - {nome}")
+                    continue
+
+                yield DominioAccount(id_externo=codigo, nome=nome, fonte_raw=row)
 
-        print(f"✔ DOMÍNIO - {gravados} registros gravados")
-        run.details.create(fonte="DOMINIO", lidos=lidos, gravados=gravados, ignorados=ignorados)
+        if self.modo == "flush":
+            # o Domínio repete I_SECUSUARIOS: upsert em vez de inserção pura
+            item.removidos = self._flush(DominioAccount.objects)
+            criados, atualizados = bulk_upsert(
+                DominioAccount, self._cronometrar(item, contas()), unique_field="id_externo",
+                update_fields=["nome", "fonte_raw"], chunk_size=self.chunk_size, rotulo="DOMINIO",
+            )
+            item.inseridos, item.atualizados = criados, atualizados
+            item.gravados = criados + atualizados
+        else:
+            self._gravar(
+                item, DominioAccount, contas(),
+                campos=["id_externo", "nome"], chave="id_externo",
+                rotulo="DOMINIO",
+            )
+        item.save()
 
+        print(
+            f"✔ DOMÍNIO - {item.gravados} registros gravados "
+            f"({item.inseridos} novos, {item.atualizados} atualizados)"
+        )
+        return item
 
     # ==================================================
     # CCONTROL WEB
     # ==================================================
-    @transaction.atomic
-    def sync_ccontrolweb(self, run):
-        item = SyncDetail.objects.create(run=run, fonte="CCONTROLWEB")
-        data = fetch_ccontrolweb()
-        item.lidos = len(data)
-
-        # Se você quer continuar limpando a tabela antes de repopular:
-        self._flush(CcontrolWebUser.objects)
-
-        gravados = 0
-        seen = set()  # controla duplicidade dentro do lote
-
-        for row in data:
-            # Segurança: ignore itens inválidos
-            if not isinstance(row, dict):
-                continue
-
-            nome = (row.get("nome_completo") or "").strip()
-            email = (row.get("email") or "").strip()
-
-            # Ignore emails vazios
-            if not email:
-                continue
-
-            # Dedup no mesmo lote (case-insensitive)
-            email_key = email.lower()
-            if email_key in seen:
-                continue
-            seen.add(email_key)
-
-            # Upsert por email para maior robustez
-            obj, created = CcontrolWebUser.objects.update_or_create(
-                email=email,
-                defaults={
-                    "nome_completo": nome,
-                    "fonte_raw": row,
-                },
+    @_etapa
+    def sync_ccontrolweb(self, run, data, duracao_fetch=None):
+        item = SyncDetail.objects.create(run=run, fonte="CCONTROLWEB", duracao_fetch=duracao_fetch)
+
+        def usuarios():
+            seen = set()  # controla duplicidade dentro do lote
+            for row in self._linhas(item, data):
+                # Segurança: ignore itens inválidos
+                if not isinstance(row, dict):
+                    continue
+
+                nome = (row.get("nome_completo") or "").strip()
+                email = (row.get("email") or "").strip()
+
+                # Ignore emails vazios
+                if not email:
+                    continue
+
+                # Dedup no mesmo lote (case-insensitive)
+                email_key = email.lower()
+                if email_key in seen:
+                    continue
+                seen.add(email_key)
+
+                yield CcontrolWebUser(email=email, nome_completo=nome, fonte_raw=row)
+
+        if self.modo == "flush":
+            # Limpa a tabela e repopula com upsert por email
+            item.removidos = self._flush(CcontrolWebUser.objects)
+            criados, atualizados = bulk_upsert(
+                CcontrolWebUser, self._cronometrar(item, usuarios()), unique_field="email",
+                update_fields=["nome_completo", "fonte_raw"], chunk_size=self.chunk_size, rotulo="CCONTROLWEB",
+            )
+            item.inseridos, item.atualizados = criados, atualizados
+            gravados = item.gravados = criados + atualizados
+        else:
+            gravados = self._gravar(
+                item, CcontrolWebUser, usuarios(),
+                campos=["nome_completo", "email"], chave="email",
+                rotulo="CCONTROLWEB",
             )
-            if created:
-                gravados += 1
-            else:
-                # Se preferir contar atualizações como “gravados” também, troque para: gravados += 1
-                pass
 
-        item.gravados = gravados
         item.save()
-        print(f"✔ CCONTROLWEB - {gravados} registros gravados")
+        print(
+            f"✔ CCONTROLWEB - {gravados} registros gravados "
+            f"({item.inseridos} novos, {item.atualizados} atualizados)"
+        )
+        return item
 
     # ==================================================
     # Visão Lógica
     # ==================================================
-    @transaction.atomic
-    def sync_visaologica(self, run):
-        item = SyncDetail.objects.create(run=run, fonte="VISAOLOGICA")
-
-        data = fetch_visaologica()
-        item.lidos = len(data)
-
-        gravados = 0
-
-        for row in data:
-            codigo = str(row.get("CodigoFuncionario", "")).strip()
-            if not codigo:
-                continue
-
-            VisaoLogicaUser.objects.update_or_create(
-                codigo_funcionario=codigo,
-                defaults={
-                    "nome_funcionario": (row.get("NomeFuncionario") or "").strip(),
-                    "dep_funcionario": (row.get("DepFuncionario") or "").strip(),
-                    "fonte_raw": row,
-                }
-            )
-            gravados += 1
+    @_etapa
+    def sync_visaologica(self, run, data, duracao_fetch=None):
+        item = SyncDetail.objects.create(run=run, fonte="VISAOLOGICA", duracao_fetch=duracao_fetch)
+
+        def usuarios():
+            for row in self._linhas(item, data):
+                codigo = str(row.get("CodigoFuncionario", "")).strip()
+                if not codigo:
+                    continue
+
+                yield VisaoLogicaUser(
+                    codigo_funcionario=codigo,
+                    nome_funcionario=(row.get("NomeFuncionario") or "").strip(),
+                    dep_funcionario=(row.get("DepFuncionario") or "").strip(),
+                    fonte_raw=row,
+                )
 
-        item.gravados = gravados
+        if self.modo == "flush":
+            item.removidos = self._flush(VisaoLogicaUser.objects)
+            criados, atualizados = bulk_upsert(
+                VisaoLogicaUser, self._cronometrar(item, usuarios()), unique_field="codigo_funcionario",
+                update_fields=["nome_funcionario", "dep_funcionario", "fonte_raw"],
+                chunk_size=self.chunk_size, rotulo="VISAOLOGICA",
+            )
+            item.inseridos, item.atualizados = criados, atualizados
+            item.gravados = criados + atualizados
+        else:
+            self._gravar(
+                item, VisaoLogicaUser, usuarios(),
+                campos=["codigo_funcionario", "nome_funcionario", "dep_funcionario"],
+                chave="codigo_funcionario", rotulo="VISAOLOGICA",
+            )
         item.save()
 
-        print(f"✔ VISAOLOGICA - {gravados} registros gravados")
+        print(
+            f"✔ VISAOLOGICA - {item.gravados} registros gravados "
+            f"({item.inseridos} novos, {item.atualizados} atualizados)"
+        )
+        return item
 
 
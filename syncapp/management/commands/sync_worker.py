@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.services.jobs import rodar_worker
+
+
+class Command(BaseCommand):
+    help = "Processa a fila de jobs (sync_all, sync_bases, run_sync), um por vez."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uma-vez",
+            action="store_true",
+            help="Processa os jobs pendentes e sai (útil em agendador/cron).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=None,
+            help="Segundos entre consultas à fila (padrão: WORKER_INTERVALO ou 2).",
+        )
+
+    def handle(self, *args, **options):
+        print("Worker de sincronização iniciado.")
+        try:
+            n = rodar_worker(intervalo=options.get("intervalo"), uma_vez=options.get("uma_vez", False))
+        except KeyboardInterrupt:
+            print("Worker interrompido.")
+            return
+        print(f"Worker finalizado ({n} jobs processados).")
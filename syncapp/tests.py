@@ -1,3 +1,91 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import BitrixUser, DominioAccount, ReconciliationResult, SyncDetail, SyncRun
+from syncapp.management.commands.sync_all import Command
+
+
+BITRIX = [{"Status": "Ativo", "name": "ana", "Nome_Completo": "Ana", "email": "ana@x"}]
+
+
+def fetchers(dados=None, **erros):
+    """
+    Fetchers falsos: BITRIX devolve um usuário, as demais fontes uma lista
+    vazia; `dados` ({fonte: registros}) substitui, `erros` ({fonte: exceção}) falha.
+    """
+    dados = {"BITRIX": BITRIX, **(dados or {})}
+
+    def fonte(nome):
+        def fetch(stream=False, metricas=None):
+            if nome in erros:
+                raise erros[nome]
+            return list(dados.get(nome, []))
+        return fetch
+
+    nomes = ["BITRIX", "PONTO", "GESTTA", "DOMINIO", "CCONTROLWEB", "VISAOLOGICA"]
+    return lambda self: {n: fonte(n) for n in nomes}
+
+
+# ======================================================
+# SYNC_ALL EM STREAMING
+# ======================================================
+
+class SyncAllStreamTests(TestCase):
+    def test_falha_qualquer_numa_fonte_nao_interrompe_as_demais(self):
+        with mock.patch.object(Command, "_fetchers", fetchers(GESTTA=RuntimeError("campo inesperado"))):
+            with self.assertRaises(CommandError):
+                call_command("sync_all", "--stream")
+
+        run = SyncRun.objects.get()
+        self.assertEqual(run.status, "error")
+        falha = SyncDetail.objects.get(run=run, fonte="GESTTA")
+        self.assertEqual(falha.mensagem_erro, "campo inesperado")
+        self.assertTrue(SyncDetail.objects.filter(run=run, fonte="RECONCILIACAO").exists())
+        self.assertTrue(SyncDetail.objects.filter(run=run, fonte="VISAOLOGICA", mensagem_erro="").exists())
+
+    def test_stream_com_flush_e_recusado(self):
+        with mock.patch.object(Command, "_fetchers", fetchers()):
+            call_command("sync_all")
+        self.assertEqual(ReconciliationResult.objects.count(), 1)
+
+        with self.assertRaises(CommandError):
+            call_command("sync_all", "--stream", "--modo", "flush")
+
+        self.assertEqual(SyncRun.objects.count(), 1)
+        self.assertEqual(BitrixUser.objects.count(), 1)
+        self.assertEqual(ReconciliationResult.objects.count(), 1)
+
+
+# ======================================================
+# CHAVE REPETIDA NA FONTE
+# ======================================================
+
+class SyncAllChaveRepetidaTests(TestCase):
+    DOMINIO = [
+        {"I_SECUSUARIOS": 1, "NOME": "ana"},
+        {"I_SECUSUARIOS": 2, "NOME": ""},
+        {"I_SECUSUARIOS": 1, "NOME": "ana2"},
+        {"I_SECUSUARIOS": "x", "NOME": "bia"},
+    ]
+
+    def sincronizar(self, *args):
+        with mock.patch.object(Command, "_fetchers", fetchers({"DOMINIO": self.DOMINIO})):
+            call_command("sync_all", *args)
+        return SyncDetail.objects.filter(fonte="DOMINIO").latest("id")
+
+    def test_diff_e_flush_ficam_com_a_ultima_ocorrencia(self):
+        for modo in ("diff", "flush"):
+            with self.subTest(modo=modo):
+                DominioAccount.objects.all().delete()
+                item = self.sincronizar("--modo", modo)
+                self.assertEqual(DominioAccount.objects.get().nome, "ana2")
+                self.assertEqual(item.lidos, 4)
+
+    def test_diff_conta_a_repeticao_em_ignorados(self):
+        item = self.sincronizar()
+
+        self.assertEqual((item.gravados, item.ignorados), (1, 3))
+        self.assertEqual(item.lidos, item.gravados + item.ignorados + item.inalterados)